@@ -1,70 +1,46 @@
+# Started before the other imports so a cold start's import time is counted
+from lib.startup import start_run, load_environment
+run_timer = start_run()
+
 import os
-import json
 import streamlit as st
-from dotenv import load_dotenv
-import google.generativeai as gen_ai
 from lib.character import Character
-from lib.file_processor import extract_text_from_uploaded_file
-from ui import setup_page, create_sidebar, display_chat_header, display_conversation_history, display_user_input
+from lib.chat_engine import greeting_message
+from ui import setup_page, create_sidebar, display_chat_header, display_conversation_history, display_message, display_user_input, stream_assistant_reply, show_run_timings, history_start, HISTORY_PAGE_SIZE
 
 # Load environment and configuration
-load_dotenv()
+load_environment()
+run_timer.mark("imports")
+
+# No spinner: this runs before setup_page(), and set_page_config must be the first element drawn
+@st.cache_resource(show_spinner=False)
+def get_chat_engine():
+    """
+    Process-wide chat engine shared by every session
+
+    With CHAT_SERVICE_URL set the app is a thin client of the chat service
+    (uvicorn service:app); otherwise the engine runs in-process on the shared,
+    rate-limited Gemini client and the configured conversation store.
+    """
+    service_url = os.getenv("CHAT_SERVICE_URL")
+    if service_url:
+        from lib.service_client import ChatServiceClient
+        return ChatServiceClient(service_url)
+    from lib.chat_engine import ChatEngine
+    return ChatEngine.from_env('gemini-1.5-flash')
 
-# Configure Gemini-Pro
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-gen_ai.configure(api_key=GOOGLE_API_KEY)
-model = gen_ai.GenerativeModel('gemini-1.5-flash')
+engine = get_chat_engine()
+run_timer.mark("resources")
 
 def extract_characters(text: str) -> list[Character]:
-    """Extract characters from text using Gemini with robust JSON handling"""
+    """Extract characters from the whole text using chunked Gemini calls"""
     if not text.strip():
         return []
 
-    prompt = f"""
-    Analyze this text and extract significant characters. For each character provide:
-    - name (string)
-    - description (string)
-    - traits (list of strings)
-    
-    Return ONLY a valid JSON array of objects formatted EXACTLY like this:
-    [
-        {{
-            "name": "Character Name",
-            "description": "Character's role and key features",
-            "traits": ["trait1", "trait2", "trait3"]
-        }}
-    ]
-    
-    Text to analyze:
-    {text[:20000]}  # First 20k chars for demo
-    """
-    
     try:
-        response = model.generate_content(prompt)
-        
-        # First try to parse directly
-        try:
-            characters_data = json.loads(response.text)
-        except json.JSONDecodeError:
-            # If direct parse fails, try to extract JSON from markdown
-            json_str = response.text.strip().strip('```json').strip('```').strip()
-            characters_data = json.loads(json_str)
-            
-        # Validate the structure
-        if not isinstance(characters_data, list):
-            raise ValueError("Expected list of characters")
-            
-        return [
-            Character(
-                name=char.get('name', 'Unnamed'),
-                description=char.get('description', 'No description'),
-                traits=char.get('traits', [])
-            ) for char in characters_data
-        ]
-        
+        return engine.extract_characters(text)
     except Exception as e:
         st.error(f"Failed to extract characters. Please try again. Error: {str(e)}")
-        st.text_area("Debug - AI Response", response.text, height=200)
         return []
 
 def main():
@@ -75,8 +51,6 @@ def main():
     # Initialize session state
     if "characters" not in st.session_state:
         st.session_state.characters = []
-    if "all_conversations" not in st.session_state:
-        st.session_state.all_conversations = {}
     if "current_character" not in st.session_state:
         st.session_state.current_character = None
     if "current_user" not in st.session_state:
@@ -96,58 +70,47 @@ def main():
         st.session_state.current_character = st.session_state.characters[0]
         st.rerun()
 
-    # Initialize conversation tracking
-    char_name = st.session_state.current_character.name
-    if char_name not in st.session_state.all_conversations:
-        st.session_state.all_conversations[char_name] = {}
+    # Load the pages on screen of the current user's conversation; the newest
+    # messages tell how long it is, and the default view needs no second read
+    char = st.session_state.current_character
+    user = st.session_state.current_user
+    history_key = f"history_{char.name}-{user}"
+    messages = engine.history(char.name, user, limit=2 * HISTORY_PAGE_SIZE)
+    offset = messages[0]["seq"] if messages else 0
+    start = history_start(history_key, offset + len(messages))
+    if start < offset:
+        messages = engine.history(char.name, user, limit=offset - start, before_seq=offset) + messages
+        offset = start
     
-    # Get or create conversation for current user
-    if st.session_state.current_user not in st.session_state.all_conversations[char_name]:
-        st.session_state.all_conversations[char_name][st.session_state.current_user] = [
-            {"role": "assistant", "content": f"Hello {st.session_state.current_user}! I'm {char_name}. How can I help you?"}
-        ]
+    # The greeting is only persisted together with the first exchange
+    greeting = [] if messages else [greeting_message(char.name, user)]
 
     # Display chat interface
-    display_chat_header(st.session_state.current_character)
-    display_conversation_history(st.session_state.all_conversations[char_name][st.session_state.current_user])
+    display_chat_header(char)
+    if st.session_state.get("book_unindexed"):
+        st.warning("The book's passages are no longer indexed (the server may have restarted); "
+                   "upload it again to ground replies in the text.")
+    display_conversation_history(greeting + messages, key=history_key, offset=offset)
 
     # Handle user input
-    if prompt := display_user_input(st.session_state.current_character):
-        messages = st.session_state.all_conversations[char_name][st.session_state.current_user]
-        
+    if prompt := display_user_input(char):
         # Add user message
-        messages.append({"role": "user", "content": prompt, "user": st.session_state.current_user})
+        pending = greeting + [{"role": "user", "content": prompt, "user": user}]
         
-        # Generate response
-        with st.spinner(f"{char_name} is thinking..."):
-            try:
-                char = st.session_state.current_character
-                context = f"""
-                You are {char.name}, {char.description}.
-                Personality traits: {', '.join(char.traits)}.
-                Current conversation with {st.session_state.current_user}:
-                {format_conversation_history(messages)}
-                Previous conversations with others:
-                {format_other_conversations(char_name)}
-                Respond naturally in character.
-                """
-                response = model.generate_content(context)
-                messages.append({"role": "assistant", "content": response.text})
-                st.rerun()
-            except Exception as e:
-                st.error(f"Error generating response: {str(e)}")
-
-def format_conversation_history(messages):
-    """Format current conversation history"""
-    return "\n".join(f"{msg.get('user', 'User')}: {msg['content']}" for msg in messages)
-
-def format_other_conversations(char_name):
-    """Format conversations with other users"""
-    other_convos = []
-    for user, messages in st.session_state.all_conversations[char_name].items():
-        if user != st.session_state.current_user:
-            other_convos.append(f"\nWith {user}:\n" + "\n".join(f"{msg['role']}: {msg['content']}" for msg in messages[-3:]))
-    return "\n".join(other_convos) if other_convos else "No previous conversations"
+        display_message(pending[-1])
+        
+        # Stream the response as it is generated; the engine persists the
+        # exchange, caches the reply and remembers it once the stream ends
+        turn = engine.start_turn(char, user, prompt, book_id=st.session_state.get("book_id"))
+        stream_assistant_reply(turn, pending)
+        if turn.retrieval_ms is not None:
+            run_timer.note("book retrieval", turn.retrieval_ms)
+        # Shown from the rerun below until a turn finds the book indexed again
+        st.session_state.book_unindexed = turn.retrieval == "unindexed"
+        if turn.completed:
+            st.rerun()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
+    run_timer.mark("render")
+    show_run_timings(run_timer)
@@ -1,15 +1,24 @@
-import os
+# Started before the other imports so a cold start's import time is counted
+from lib.startup import start_run, load_environment
+run_timer = start_run()
+
 import json
 import streamlit as st
-from dotenv import load_dotenv
-import google.generativeai as gen_ai
 from lib.character import Character
+from lib.context import ContextWindow, make_model_summarizer
 from lib.file_processor import extract_text_from_uploaded_file
+from lib.llm_client import get_client
+from lib.prompt_cache import PrefixedPrompt, persona_prefix
+from lib.streaming import ReplyStream
+from ui import display_chat_window, stream_assistant_reply, show_run_timings
 
 # Load environment and configuration
-load_dotenv()
-gen_ai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-model = gen_ai.GenerativeModel('gemini-1.5-flash')
+load_environment()
+run_timer.mark("imports")
+
+# Shared Gemini client: configured once per process, with concurrency and rate limits
+model = get_client('gemini-1.5-flash')
+run_timer.mark("resources")
 
 # Session state initialization
 if "characters" not in st.session_state:
@@ -20,6 +29,10 @@ if "current_user" not in st.session_state:
     st.session_state.current_user = "Ofgeha"  # Default user
 if "current_character" not in st.session_state:
     st.session_state.current_character = None
+if "conversation_summaries" not in st.session_state:
+    st.session_state.conversation_summaries = {}  # {character_name: {user: summary state}}
+
+context_window = ContextWindow(make_model_summarizer(model))
 
 def main():
     st.set_page_config(page_title="Multi-User Character Chat", layout="wide")
@@ -87,8 +100,7 @@ def main():
             else st.session_state.all_conversations[char.name][st.session_state.current_user]
         )
         
-        for msg in messages:
-            st.chat_message(msg["role"]).write(msg["content"])
+        display_chat_window(messages, key=f"history_{char.name}-{view_user}")
         
         # Handle new messages
         if prompt := st.chat_input(f"Message {char.name}..."):
@@ -98,30 +110,27 @@ def main():
             )
             st.chat_message("user").write(prompt)
             
-            # Generate response with full context
-            with st.spinner(f"{char.name} is thinking..."):
-                try:
-                    # Get full conversation history for context
-                    full_history = "\n".join(
-                        f"{msg['role']}: {msg['content']}" 
-                        for msg in st.session_state.all_conversations[char.name][st.session_state.current_user]
-                    )
-                    
-                    response = model.generate_content(
-                        f"""You are {char.name} with these traits: {', '.join(char.traits)}.
-                        This is your conversation with {st.session_state.current_user}:
-                        {full_history}
-                        Respond naturally to the last message:"""
-                    )
-                    
-                    assistant_msg = response.text
-                    st.session_state.all_conversations[char.name][st.session_state.current_user].append(
-                        {"role": "assistant", "content": assistant_msg}
-                    )
-                    st.chat_message("assistant").write(assistant_msg)
-                    
-                except Exception as e:
-                    st.error(f"Error generating response: {str(e)}")
+            # Stream response with recent turns plus a running summary of older ones
+            summary_state = st.session_state.conversation_summaries.setdefault(char.name, {}).setdefault(
+                st.session_state.current_user, ContextWindow.new_state()
+            )
+            full_history = context_window.build(
+                st.session_state.all_conversations[char.name][st.session_state.current_user],
+                summary_state
+            )
+            
+            context = PrefixedPrompt(persona_prefix(char), f"""
+            This is your conversation with {st.session_state.current_user}:
+            {full_history}
+            Respond naturally to the last message:""")
+            
+            with st.chat_message("assistant"):
+                stream_assistant_reply(
+                    ReplyStream(model, context),
+                    st.session_state.all_conversations[char.name][st.session_state.current_user]
+                )
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
+    run_timer.mark("render")
+    show_run_timings(run_timer)
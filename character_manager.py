@@ -1,6 +1,8 @@
-import json
 from lib.character import Character
-import google.generativeai as gen_ai
+from lib import extraction
+from lib.json_stream import iter_json_objects
+from lib.llm_client import get_client
+from lib.cache import get_default_cache
 import streamlit as st
 
 
@@ -13,26 +15,7 @@ def initialize_session_state():
     if "current_user" not in st.session_state:
         st.session_state.current_user = "Guest"
 
-def extract_characters(text: str) -> list[Character]:
-    """
-    Extract characters from text using AI with robust error handling
-    
-    Args:
-        text (str): Input text to analyze
-        
-    Returns:
-        List[Character]: List of extracted characters
-        
-    Raises:
-        ValueError: If text parsing fails
-    """
-    if not text.strip():
-        st.warning("Please provide text with content")
-        return []
-
-    try:
-        # Structured prompt with clear output format
-        prompt = f"""
+CHUNK_PROMPT = """
         ANALYZE THIS TEXT AND EXTRACT CHARACTERS:
         
         Instructions:
@@ -54,47 +37,66 @@ def extract_characters(text: str) -> list[Character]:
             ]
         }}
         
-        Text to analyze (first 20k chars):
-        {text[:20000]}
+        Text to analyze:
+        {text}
         """
-        
-        # Generate response with stricter configuration
-        response = gen_ai.generate_content(
-            contents=[prompt],
-            generation_config={
-                "temperature": 0.3,  # More deterministic
-                "top_p": 0.7,
-                "max_output_tokens": 2000
-            }
-        )
-        
-        # Parse with multiple fallback strategies
+
+# Shared Gemini client: configured once per process, with concurrency and rate limits
+model = get_client('gemini-1.5-flash')
+
+def _extract_chunk(model, chunk: str) -> list[Character]:
+    """Extract characters from a single chunk of text"""
+    # Generate response with stricter configuration
+    response = model.generate_content(
+        CHUNK_PROMPT.format(text=chunk),
+        generation_config={
+            "temperature": 0.3,  # More deterministic
+            "top_p": 0.7,
+            "max_output_tokens": 2000
+        }
+    )
+    
+    # Objects are read from the "characters" array wherever it sits in the reply,
+    # so markdown fences or surrounding prose don't matter
+    objects = iter_json_objects([response.text])
+    
+    # Create Character objects, skipping entries with missing fields
+    # (runs on a worker thread, so no Streamlit calls here)
+    characters = []
+    for char_data in objects:
         try:
-            # First try direct parse
-            data = json.loads(response.text)
-        except json.JSONDecodeError:
-            # Try extracting from markdown code block
-            json_str = response.text.strip()
-            if '```json' in json_str:
-                json_str = json_str.split('```json')[1].split('```')[0]
-            data = json.loads(json_str)
+            characters.append(Character(
+                name=char_data["name"].strip(),
+                description=char_data["description"].strip(),
+                traits=[t.strip() for t in char_data["traits"]]
+            ))
+        except KeyError:
+            continue
+    return characters
+
+def extract_characters(text: str) -> list[Character]:
+    """
+    Extract characters from text using AI with robust error handling
+    
+    The full text is split into overlapping chunks which are analyzed
+    concurrently and merged into one deduplicated list.
+    
+    Args:
+        text (str): Input text to analyze
         
-        # Validate response structure
-        if "characters" not in data or not isinstance(data["characters"], list):
-            raise ValueError("Invalid character data format")
-            
-        # Create Character objects with validation
-        characters = []
-        for char_data in data["characters"]:
-            try:
-                characters.append(Character(
-                    name=char_data["name"].strip(),
-                    description=char_data["description"].strip(),
-                    traits=[t.strip() for t in char_data["traits"]]
-                ))
-            except KeyError as e:
-                st.warning(f"Skipping invalid character: Missing {str(e)}")
-                continue
+    Returns:
+        List[Character]: List of extracted characters
+        
+    Raises:
+        ValueError: If text parsing fails
+    """
+    if not text.strip():
+        st.warning("Please provide text with content")
+        return []
+
+    try:
+        characters = extraction.extract_characters(model, text, extract_fn=_extract_chunk,
+                                                   cache=get_default_cache(), prompt_version=f"manager-{extraction.PROMPT_VERSION}")
                 
         if not characters:
             raise ValueError("No valid characters found")
@@ -103,5 +105,5 @@ def extract_characters(text: str) -> list[Character]:
         
     except Exception as e:
         st.error("Character extraction failed")
-        st.json({"error": str(e), "raw_response": response.text if 'response' in locals() else None})
-        return []
\ No newline at end of file
+        st.json({"error": str(e)})
+        return []
@@ -1,64 +1,51 @@
+# Started before the other imports so a cold start's import time is counted
+from lib.startup import start_run, load_environment
+run_timer = start_run()
+
 import os
-import json
 import streamlit as st
-import chromadb
-from dotenv import load_dotenv
-import google.generativeai as gen_ai
 from lib.character import Character
+from lib import extraction
+from lib.cache import get_default_cache
+from lib.conversation_store import create_store
+from lib.context import ContextWindow, make_model_summarizer
 from lib.file_processor import extract_text_from_uploaded_file
+from lib.llm_client import get_client
+from lib.prompt_cache import PrefixedPrompt, persona_prefix
+from lib.streaming import ReplyStream
+from lib.write_behind import WriteBehindQueue
+from ui import stream_assistant_reply, show_run_timings
 
 # Load environment variables
-load_dotenv()
+load_environment()
+run_timer.mark("imports")
+
+# UI Configuration; must be the first Streamlit element, before any cached resource's spinner
+st.set_page_config(page_title="AI Character Simulator", page_icon=":brain:", layout="wide")
 
-# Configure Gemini-Pro
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-gen_ai.configure(api_key=GOOGLE_API_KEY)
-model = gen_ai.GenerativeModel('gemini-1.5-flash')
+# Shared Gemini client: configured once per process, with concurrency and rate limits
+model = get_client('gemini-1.5-flash')
 
 # Configure ChromaDB
-chroma_client = chromadb.PersistentClient(path="./chroma_db")
-collection = chroma_client.get_or_create_collection(name="character_chats")
+@st.cache_resource
+def get_conversation_store():
+    """Process-wide write-behind queue over the Chroma message store"""
+    return WriteBehindQueue(create_store(os.getenv("CONVERSATION_STORE", "chroma")))
 
-# UI Configuration
-st.set_page_config(page_title="AI Character Simulator", page_icon=":brain:", layout="wide")
+# Reads go through the queue too, so pending writes are always visible
+store = get_conversation_store()
+run_timer.mark("resources")
+
+# Number of messages shown per history page
+HISTORY_PAGE_SIZE = 50
 
 def extract_characters(text: str) -> list[Character]:
-    """Extract characters from text using Gemini"""
+    """Extract characters from the whole text using chunked Gemini calls"""
     if not text.strip():
         return []
 
-    prompt = f"""
-    Analyze this text and extract significant characters. For each character provide:
-    - name (string)
-    - description (string)
-    - traits (list of strings)
-    
-    Return ONLY a valid JSON array of objects like:
-    [
-        {{
-            "name": "Character Name",
-            "description": "Character's role",
-            "traits": ["trait1", "trait2"]
-        }}
-    ]
-    
-    Text to analyze:
-    {text[:20000]}  # First 20k chars
-    """
-
     try:
-        response = model.generate_content(prompt)
-        json_str = response.text.strip().strip('```json').strip('```').strip()
-        characters_data = json.loads(json_str)
-        
-        return [
-            Character(
-                name=char.get('name', 'Unnamed'),
-                description=char.get('description', 'No description'),
-                traits=char.get('traits', [])
-            ) for char in characters_data
-        ]
-        
+        return extraction.extract_characters(model, text, cache=get_default_cache())
     except Exception as e:
         st.error(f"Failed to extract characters. Error: {str(e)}")
         return []
@@ -129,49 +116,53 @@ def main():
     user = st.session_state.current_user
     conversation_id = f"{char_name}-{user}"
     
-    messages = collection.get(ids=[conversation_id])["metadatas"]
-    if messages:
-        messages = messages[0]["messages"]
-    else:
-        messages = [{"role": "assistant", "content": f"Hello {user}! I'm {char_name}. How can I help you?"}]
+    meta = store.get_meta(conversation_id)
+    
+    # Only the tail is read; older pages are fetched on demand
+    page_key = f"history_pages_{conversation_id}"
+    if page_key not in st.session_state:
+        st.session_state[page_key] = 1
+    messages = store.read_tail(conversation_id, HISTORY_PAGE_SIZE * st.session_state[page_key], meta=meta)
+    if messages and messages[0]["seq"] > 0:
+        if st.button("Load older messages"):
+            st.session_state[page_key] += 1
+            st.rerun()
     
-    for msg in messages:
+    greeting = []
+    if not messages:
+        greeting = [{"role": "assistant", "content": f"Hello {user}! I'm {char_name}. How can I help you?"}]
+    
+    for msg in greeting + messages:
         st.chat_message(msg["role"]).write(msg["content"])
 
     if prompt := st.chat_input(f"Message {char_name}..."):
-        messages.append({"role": "user", "content": prompt})
+        user_msg = {"role": "user", "content": prompt}
         st.chat_message("user").write(f"{user}: {prompt}")
         
-        with st.spinner(f"{char_name} is thinking..."):
-            try:
-                char = st.session_state.current_character
-                context = f"""
-                You are {char.name}, {char.description}.
-                Personality traits: {', '.join(char.traits)}.
-                
-                Conversation so far:
-                {format_conversation_history(messages)}
-                
-                Respond naturally in character.
-                """
-                
-                response = model.generate_content(context)
-                assistant_msg = response.text
-                
-                messages.append({"role": "assistant", "content": assistant_msg})
-                st.chat_message("assistant").write(assistant_msg)
-                
-                collection.add(
-                    ids=[conversation_id],
-                    metadatas=[{"messages": messages}]
-                )
-                
-            except Exception as e:
-                st.error(f"Error generating response: {str(e)}")
+        # Running summary of older turns is kept in the conversation header
+        summary_state = {"summary": meta["summary"], "summarized": meta["summarized"]}
+        unsummarized = store.read_range(conversation_id, summary_state["summarized"]) if meta["last_seq"] >= 0 else []
+        pending = greeting + [user_msg]
+        
+        char = st.session_state.current_character
+        context = PrefixedPrompt(persona_prefix(char), f"""
+        Conversation so far:
+        {context_window.build(unsummarized + pending, summary_state, offset=summary_state["summarized"])}
+        """)
+        
+        with st.chat_message("assistant"):
+            stream_assistant_reply(ReplyStream(model, context), pending)
+        
+        # Persisted even if the reply failed, so the user's message is kept; written in the background
+        store.append(conversation_id, pending, meta={**meta, **summary_state})
 
 def format_conversation_history(messages):
     """Format current conversation history"""
     return "\n".join(f"{msg['role']}: {msg['content']}" for msg in messages)
 
+context_window = ContextWindow(make_model_summarizer(model), format_messages=format_conversation_history)
+
 if __name__ == "__main__":
     main()
+    run_timer.mark("render")
+    show_run_timings(run_timer)
@@ -0,0 +1,97 @@
+import re
+import math
+from array import array
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have he her his i in is it its me my
+of on or our she so that the their them they this to was we were what with you your
+""".split())
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase word tokens with common stopwords removed"""
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+class BM25Index:
+    """
+    Incremental inverted index with BM25 ranking
+
+    Postings are kept per term in typed arrays (doc ids and term frequencies),
+    so adding a document is an append and scoring a term is a single
+    vectorized NumPy pass over its postings.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_lengths = array("I")
+        self.total_length = 0
+        self.postings = {}  # term -> (array of doc ids, array of term frequencies)
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def add(self, text: str) -> int:
+        """Index a document and return its id"""
+        doc_id = len(self.doc_lengths)
+        tokens = tokenize(text)
+        counts = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for term, tf in counts.items():
+            entry = self.postings.get(term)
+            if entry is None:
+                entry = self.postings[term] = (array("I"), array("I"))
+            entry[0].append(doc_id)
+            entry[1].append(tf)
+        self.doc_lengths.append(len(tokens))
+        self.total_length += len(tokens)
+        return doc_id
+
+    def search(self, query: str, top_k: int = 10) -> list[tuple[int, float]]:
+        """Return up to top_k (doc_id, score) pairs, best first"""
+        n_docs = len(self.doc_lengths)
+        terms = [t for t in set(tokenize(query)) if t in self.postings]
+        if not n_docs or not terms:
+            return []
+
+        avg_length = self.total_length / n_docs or 1.0
+        doc_lengths = np.frombuffer(self.doc_lengths, dtype=np.uint32)
+        scores = np.zeros(n_docs, dtype=np.float32)
+        for term in terms:
+            doc_ids, freqs = self.postings[term]
+            ids = np.frombuffer(doc_ids, dtype=np.uint32)
+            tf = np.frombuffer(freqs, dtype=np.uint32).astype(np.float32)
+            idf = math.log(1 + (n_docs - len(ids) + 0.5) / (len(ids) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * doc_lengths[ids] / avg_length)
+            scores[ids] += idf * tf * (self.k1 + 1) / (tf + norm)
+            del ids, tf  # release buffer views so the arrays stay appendable
+
+        del doc_lengths
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(scores[candidates], -top_k)[-top_k:]]
+        ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(int(doc_id), float(scores[doc_id])) for doc_id in ranked]
+
+    def to_state(self) -> dict:
+        """Compact, picklable snapshot of the index"""
+        return {
+            "k1": self.k1,
+            "b": self.b,
+            "doc_lengths": self.doc_lengths.tobytes(),
+            "postings": {term: (ids.tobytes(), tfs.tobytes()) for term, (ids, tfs) in self.postings.items()},
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> "BM25Index":
+        index = cls(state["k1"], state["b"])
+        index.doc_lengths.frombytes(state["doc_lengths"])
+        index.total_length = sum(index.doc_lengths)
+        for term, (ids, tfs) in state["postings"].items():
+            entry = index.postings[term] = (array("I"), array("I"))
+            entry[0].frombytes(ids)
+            entry[1].frombytes(tfs)
+        return index
@@ -0,0 +1,127 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from lib.bm25 import BM25Index
+from lib.context import estimate_tokens
+from lib.extraction import split_text
+from lib.vector_memory import HashingEmbedder, VectorMemory
+
+PASSAGE_CHARS = int(os.getenv("BOOK_PASSAGE_CHARS", "1200"))
+PASSAGE_OVERLAP = int(os.getenv("BOOK_PASSAGE_OVERLAP", "200"))
+TOP_K = int(os.getenv("BOOK_TOP_K", "3"))
+# Upper bound on passage tokens added to a prompt, however long the passages are
+TOKEN_BUDGET = int(os.getenv("BOOK_TOKEN_BUDGET", "900"))
+USE_VECTORS = os.getenv("BOOK_VECTORS", "0") == "1"
+MAX_BOOKS = int(os.getenv("BOOK_INDEX_MAX_BOOKS", "32"))
+RRF_K = 60
+
+class BookIndex:
+    """
+    Searchable passages of one book
+
+    The text is split into overlapping, paragraph-aligned passages indexed
+    with BM25 and, optionally, a VectorMemory. With both, rankings are merged
+    by reciprocal rank fusion.
+    """
+
+    def __init__(self, passages: list[str], vectors: bool = USE_VECTORS, embedder=None):
+        self.passages = passages
+        self.bm25 = BM25Index()
+        for passage in passages:
+            self.bm25.add(passage)
+        self.vectors = None
+        if vectors:
+            self.vectors = VectorMemory(embedder or HashingEmbedder(), capacity=max(1, len(passages)))
+            self.vectors.add(passages, [{"id": i} for i in range(len(passages))])
+
+    @classmethod
+    def from_text(cls, text: str, passage_chars: int = PASSAGE_CHARS, overlap: int = PASSAGE_OVERLAP,
+                  **kwargs) -> "BookIndex":
+        return cls(split_text(text, passage_chars, overlap), **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.passages)
+
+    def search(self, query: str, top_k: int = TOP_K) -> list[tuple[int, float]]:
+        """Up to top_k (passage id, score) pairs, best first"""
+        lexical = self.bm25.search(query, top_k * 2 if self.vectors else top_k)
+        if self.vectors is None:
+            return lexical
+        semantic = [(payload["id"], score) for payload, score in self.vectors.search([query], top_k * 2)[0]
+                    if score > 0]
+        fused = {}
+        for ranking in (lexical, semantic):
+            for rank, (passage_id, _) in enumerate(ranking):
+                fused[passage_id] = fused.get(passage_id, 0.0) + 1.0 / (RRF_K + rank)
+        return sorted(fused.items(), key=lambda item: -item[1])[:top_k]
+
+    def passages_for(self, query: str, top_k: int = TOP_K, token_budget: int = TOKEN_BUDGET) -> list[str]:
+        """The best passages for a query, in book order, within token_budget"""
+        chosen, used = [], 0
+        for passage_id, _ in self.search(query, top_k):
+            tokens = estimate_tokens(self.passages[passage_id])
+            if used + tokens > token_budget:
+                continue
+            chosen.append(passage_id)
+            used += tokens
+        return [self.passages[passage_id] for passage_id in sorted(chosen)]
+
+def format_passages(passages: list[str]) -> str:
+    if not passages:
+        return "No passages retrieved"
+    return "\n\n".join(f"[{i}] {passage.strip()}" for i, passage in enumerate(passages, 1))
+
+class BookLibrary:
+    """
+    Process-wide BookIndex per book id, least recently used evicted first
+
+    `stats` tracks retrieval latency over every search.
+    """
+
+    def __init__(self, max_books: int = MAX_BOOKS, **index_options):
+        self.max_books = max_books
+        self.index_options = index_options
+        self._books = OrderedDict()  # book id -> BookIndex
+        self._lock = threading.Lock()
+        self.stats = {"books_indexed": 0, "searches": 0, "unindexed": 0, "total_ms": 0.0, "max_ms": 0.0}
+
+    def __contains__(self, book_id: str) -> bool:
+        return book_id in self._books
+
+    def add(self, book_id: str, text: str) -> BookIndex:
+        """Index a book unless it already is"""
+        with self._lock:
+            index = self._books.get(book_id)
+            if index is not None:
+                self._books.move_to_end(book_id)
+                return index
+        # Indexing takes a while for a long book; other books stay searchable meanwhile
+        index = BookIndex.from_text(text, **self.index_options)
+        with self._lock:
+            self._books[book_id] = index
+            self.stats["books_indexed"] += 1
+            while len(self._books) > self.max_books:
+                self._books.popitem(last=False)
+        return index
+
+    def retrieve(self, book_id: str, query: str, top_k: int = TOP_K) -> tuple[list[str] | None, float]:
+        """
+        (passages for the query, retrieval time in ms)
+
+        Passages are None for a book that is not indexed: never added, evicted,
+        or lost with a restart (the index lives in memory).
+        """
+        start = time.perf_counter()
+        with self._lock:
+            index = self._books.get(book_id)
+            if index is not None:
+                self._books.move_to_end(book_id)
+        passages = index.passages_for(query, top_k) if index is not None else None
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.stats["searches"] += 1
+            self.stats["unindexed"] += index is None
+            self.stats["total_ms"] += elapsed_ms
+            self.stats["max_ms"] = max(self.stats["max_ms"], elapsed_ms)
+        return passages, elapsed_ms
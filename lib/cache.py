@@ -0,0 +1,132 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from dataclasses import asdict
+from lib.character import Character
+
+DEFAULT_CACHE_DIR = os.getenv("EXTRACTION_CACHE_DIR", "./.cache/characters")
+DEFAULT_MAX_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", "500"))
+DEFAULT_TTL = float(os.getenv("EXTRACTION_CACHE_TTL", str(7 * 24 * 3600)))  # seconds, 0 disables expiry
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so trivially different uploads share a cache entry"""
+    return " ".join(text.split())
+
+def cache_key(text: str, *parts: str) -> str:
+    """Content hash of the normalized text plus prompt/model version parts"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    digest.update(normalize_text(text).encode("utf-8"))
+    return digest.hexdigest()
+
+class ExtractionCache:
+    """Persistent, content-addressed cache of extracted character lists
+
+    One JSON file per entry. Entries expire `ttl` seconds after they were
+    created. File times carry the bookkeeping, so it survives restarts and is
+    shared between processes: mtime is the creation time and atime the last
+    access. Once there are more than `max_entries`, expired and then least
+    recently used entries are evicted in one batch, down to 90% of the limit.
+    """
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 ttl: float = DEFAULT_TTL):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._count = None  # entries on disk, counted on the first put
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> list[Character] | None:
+        """Return cached characters or None on miss/expiry"""
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if self.ttl and time.time() - entry.get("created", 0) > self.ttl:
+            self._remove(path)
+            return None
+
+        try:
+            os.utime(path, (time.time(), entry.get("created", 0)))  # mark as recently used
+        except OSError:
+            pass
+        return [Character(**char) for char in entry["characters"]]
+
+    def put(self, key: str, characters: list[Character]):
+        """Store characters under key and evict least recently used entries"""
+        created = time.time()
+        entry = {"created": created, "characters": [asdict(char) for char in characters]}
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with self._lock:
+            if self._count is None:
+                self._count = sum(name.endswith(".json") for name in os.listdir(self.directory))
+            is_new = not os.path.exists(path)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.utime(tmp_path, (created, created))
+            os.replace(tmp_path, path)
+            self._count += is_new
+            if self._count > self.max_entries:
+                self._evict()
+
+    def clear(self):
+        """Remove every cache entry"""
+        with self._lock:
+            for name in os.listdir(self.directory):
+                if name.endswith(".json"):
+                    self._remove(os.path.join(self.directory, name))
+            self._count = 0
+
+    def _evict(self):
+        entries = []
+        now = time.time()
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if self.ttl and now - stat.st_mtime > self.ttl:
+                self._remove(path)  # expired: mtime is the creation time
+            else:
+                entries.append((stat.st_atime, path))
+
+        # Evict a batch so the next puts don't each rescan the directory
+        keep = self.max_entries * 9 // 10
+        if len(entries) > self.max_entries:
+            entries.sort()
+            for _, path in entries[:len(entries) - keep]:
+                self._remove(path)
+            entries = entries[len(entries) - keep:]
+        self._count = len(entries)
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+_default_cache = None
+
+def get_default_cache() -> ExtractionCache:
+    """Process-wide cache configured from the environment"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ExtractionCache()
+    return _default_cache
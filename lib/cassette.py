@@ -0,0 +1,222 @@
+"""Record-and-replay of model traffic for reproducible benchmarks
+
+Record a workload once against a real (or fake) backend, then replay it with
+the original or scaled latencies:
+
+    LLM_CASSETTE=runs/book.jsonl.gz LLM_CASSETTE_MODE=record streamlit run man.py
+    LLM_CASSETTE=runs/book.jsonl.gz LLM_CASSETTE_SCALE=0.5 python -m scripts.bench_...
+
+Each call is one gzip-compressed JSON line keyed by a hash of the prompt.
+"""
+import os
+import gzip
+import json
+import time
+import atexit
+import hashlib
+import threading
+from collections import Counter, defaultdict
+from lib.llm_client import ChatSession, contents_text
+
+MODES = ("record", "replay", "auto")
+# Transport options that do not change what the model is asked
+_IGNORED_KWARGS = {"request_options", "stream"}
+
+class CassetteMiss(KeyError):
+    """Replay was asked for a prompt the cassette never recorded"""
+
+class ReplayedError(Exception):
+    """An API error captured while recording; `code` is kept so retry logic behaves the same"""
+
+    def __init__(self, code, message: str, name: str = None):
+        super().__init__(message)
+        self.code = code
+        self.name = name
+
+class CassetteResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+def prompt_hash(contents, **kwargs) -> str:
+    """Key for a call: the flattened prompt plus any generation options"""
+    options = {k: v for k, v in kwargs.items() if k not in _IGNORED_KWARGS}
+    payload = contents_text(contents)
+    if options:
+        payload += "\0" + json.dumps(options, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+class CassetteModel:
+    """
+    Backend wrapper that records calls to a cassette file or replays them
+
+    In "record" mode every call goes to `backend` and is appended to `path`
+    with its latency, or with each chunk's offset from the start of the call
+    when streaming. Errors are recorded too. In "replay" mode calls are served
+    from the file, sleeping the recorded delays times `latency_scale` (0 for
+    no delay); a prompt seen several times gets its recordings in order and
+    the last one after that. "auto" replays known prompts and records the rest.
+    """
+
+    def __init__(self, path: str, mode: str = "replay", backend=None,
+                 latency_scale: float = 1.0, model_name: str = None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        if mode != "replay" and backend is None:
+            raise ValueError(f"Cassette mode {mode!r} needs a backend to record from")
+        self.path = path
+        self.mode = mode
+        self.backend = backend
+        self.latency_scale = latency_scale
+        self.model_name = model_name or getattr(backend, "model_name", "cassette")
+        self._entries = defaultdict(list)  # key -> recorded calls, in order
+        self._seen = Counter()
+        self._lock = threading.Lock()
+        self._file = None
+        self.stats = {"replayed": 0, "recorded": 0, "misses": 0}
+        truncated = False
+        if mode != "record" and os.path.exists(path):
+            truncated = self._load()
+        if mode != "replay":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            # Appending after a truncated gzip member would make the new recordings unreadable,
+            # so a damaged cassette is rewritten from what could be read
+            self._file = gzip.open(path, "wt" if mode == "record" or truncated else "at", encoding="utf-8")
+            if truncated:
+                for entries in self._entries.values():
+                    for entry in entries:
+                        self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+                self._file.flush()
+            atexit.register(self.close)
+
+    @classmethod
+    def from_env(cls, model_name: str, backend_factory) -> "CassetteModel":
+        """Configure from LLM_CASSETTE, LLM_CASSETTE_MODE and LLM_CASSETTE_SCALE"""
+        mode = os.getenv("LLM_CASSETTE_MODE", "replay")
+        backend = backend_factory(model_name) if mode != "replay" else None
+        return cls(os.environ["LLM_CASSETTE"], mode, backend,
+                   latency_scale=float(os.getenv("LLM_CASSETTE_SCALE", "1.0")), model_name=model_name)
+
+    def _load(self) -> bool:
+        """Read every complete entry; True if the file ends early (a recording run was killed)"""
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            try:
+                for line in f:
+                    # A run killed mid-write leaves a truncated last line
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        return True
+                    self._entries[entry["key"]].append(entry)
+            except (EOFError, gzip.BadGzipFile):
+                # ...and a gzip stream without its end-of-stream marker
+                return True
+        return False
+
+    def _write(self, entry: dict):
+        with self._lock:
+            self._entries[entry["key"]].append(entry)
+            self.stats["recorded"] += 1
+            if self._file is not None:
+                self._file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _next_entry(self, key: str) -> dict | None:
+        with self._lock:
+            recorded = self._entries.get(key)
+            if not recorded:
+                return None
+            occurrence = self._seen[key]
+            self._seen[key] += 1
+            return recorded[min(occurrence, len(recorded) - 1)]
+
+    def generate_content(self, contents, stream: bool = False, **kwargs):
+        key = prompt_hash(contents, **kwargs)
+        entry = self._next_entry(key) if self.mode != "record" else None
+        if entry is not None:
+            self.stats["replayed"] += 1
+            return self._replay_stream(entry) if stream else self._replay(entry)
+        if self.mode == "replay":
+            self.stats["misses"] += 1
+            raise CassetteMiss(f"No recording for prompt {key} in {self.path}")
+        with self._lock:
+            # Keep occurrence counts aligned so a later replay of this run lines up
+            self._seen[key] += 1
+        if stream:
+            return self._record_stream(key, contents, **kwargs)
+        return self._record(key, contents, **kwargs)
+
+    def start_chat(self, history: list = None) -> ChatSession:
+        return ChatSession(self, history)
+
+    def _record(self, key: str, contents, **kwargs):
+        start = time.monotonic()
+        try:
+            response = self.backend.generate_content(contents, **kwargs)
+        except Exception as e:
+            self._write({"key": key, "latency": time.monotonic() - start, "error": _describe(e)})
+            raise
+        self._write({"key": key, "latency": time.monotonic() - start, "text": response.text})
+        return response
+
+    def _record_stream(self, key: str, contents, **kwargs):
+        start = time.monotonic()
+        chunks = []
+        entry = {"key": key, "chunks": chunks}
+        try:
+            for chunk in self.backend.generate_content(contents, stream=True, **kwargs):
+                chunks.append([round(time.monotonic() - start, 6), chunk.text])
+                yield chunk
+        except Exception as e:
+            entry["error"] = _describe(e)
+            entry["latency"] = time.monotonic() - start
+            raise
+        finally:
+            # Also reached when the consumer stops early; replay then serves the same prefix
+            self._write(entry)
+
+    def _sleep(self, seconds: float):
+        if self.latency_scale > 0 and seconds > 0:
+            time.sleep(seconds * self.latency_scale)
+
+    def _replay(self, entry: dict) -> CassetteResponse:
+        if "chunks" in entry:
+            chunks = entry["chunks"]
+            self._sleep(entry.get("latency", chunks[-1][0] if chunks else 0))
+            text = "".join(text for _, text in chunks)
+        else:
+            self._sleep(entry["latency"])
+            text = entry.get("text", "")
+        if "error" in entry:
+            raise _rebuild(entry["error"])
+        return CassetteResponse(text)
+
+    def _replay_stream(self, entry: dict):
+        chunks = entry["chunks"] if "chunks" in entry else [[entry["latency"], entry["text"]]] if "text" in entry else []
+        elapsed = 0.0
+        for offset, text in chunks:
+            self._sleep(offset - elapsed)
+            elapsed = offset
+            yield CassetteResponse(text)
+        if "error" in entry:
+            self._sleep(entry.get("latency", elapsed) - elapsed)
+            raise _rebuild(entry["error"])
+
+def _describe(error: Exception) -> dict:
+    code = getattr(error, "code", None)
+    if callable(code):  # google.api_core exposes code as a property, grpc as a method
+        code = None
+    return {"type": type(error).__name__, "code": code if isinstance(code, (int, str)) else None,
+            "message": str(error)}
+
+def _rebuild(error: dict) -> Exception:
+    if error["type"] == "TimeoutError":
+        return TimeoutError(error["message"])
+    if error["type"] == "ConnectionError":
+        return ConnectionError(error["message"])
+    return ReplayedError(error["code"], error["message"], error["type"])
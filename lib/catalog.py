@@ -0,0 +1,300 @@
+import os
+import json
+import time
+import atexit
+import bisect
+import struct
+import sqlite3
+import threading
+from array import array
+from lib.character import Character
+from lib.character_table import CharacterTable
+from lib.cache import cache_key
+
+DEFAULT_PATH = os.getenv("CHARACTER_CATALOG", "./catalog.db")
+
+_SNAPSHOT_HEADER = struct.Struct("<4sQQd")  # magic, character count, max id, last book update
+_SNAPSHOT_MAGIC = b"CCS1"
+_LENGTH = struct.Struct("<Q")
+
+def name_key(name: str) -> str:
+    """Case- and whitespace-insensitive name, as used by extraction.merge_characters"""
+    return " ".join(name.lower().split())
+
+def trait_key(trait: str) -> str:
+    return " ".join(trait.lower().split())
+
+def book_key(text: str) -> str:
+    """Stable id of a book from its content"""
+    return cache_key(text)[:16]
+
+class CharacterCatalog:
+    """
+    Persistent catalog of characters across every processed book
+
+    Rows live in SQLite (WAL). In memory, characters are held in a columnar
+    CharacterTable with indexes: id -> row, name -> ids, trait -> ids (inverted
+    index) and a sorted name list for prefix search. Queries return character
+    ids in insertion order; get() turns an id into a Character.
+
+    A binary snapshot of the table next to the database (`<path>.snapshot`)
+    makes reopening a large catalog fast; it is ignored when it no longer
+    matches the database.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS books (
+            book_id TEXT PRIMARY KEY,
+            title TEXT NOT NULL DEFAULT '',
+            added REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS characters (
+            id INTEGER PRIMARY KEY,
+            book_id TEXT NOT NULL,
+            name TEXT NOT NULL,
+            description TEXT NOT NULL,
+            traits TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS characters_book ON characters (book_id);
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+        self._lock = threading.RLock()
+        self._table = CharacterTable()  # append-only; a replaced book leaves dead rows behind
+        self._ids = array("q")  # row -> id
+        self._row_books = array("I")  # row -> book ordinal
+        self._book_ids = []  # book ordinal -> book id
+        self._rows = {}  # live id -> row
+        self._books = {}  # book id -> {"title": ..., "ordinal": ..., "ids": [...]}
+        self._by_name = {}  # name key -> [ids]
+        self._by_trait = {}  # trait key -> array of rows; may hold dead rows, which queries skip
+        self._trait_keys = []  # table trait id -> trait key
+        self._names = []  # sorted (name key, id); built on first prefix search, then kept up to date
+        self._names_dirty = True
+        self._load()
+
+    @property
+    def snapshot_path(self) -> str:
+        return f"{self.path}.snapshot"
+
+    def _db_state(self) -> tuple[int, int, float]:
+        """Changes whenever a book is added or replaced, by this process or another"""
+        count, max_id = self._conn.execute("SELECT count(*), coalesce(max(id), 0) FROM characters").fetchone()
+        (updated,) = self._conn.execute("SELECT coalesce(max(added), 0) FROM books").fetchone()
+        return count, max_id, updated
+
+    def _load(self):
+        for book_id, title in self._conn.execute("SELECT book_id, title FROM books").fetchall():
+            self._book(book_id, title)
+        if self._load_snapshot():
+            return
+        rows = self._conn.execute("SELECT id, book_id, name, description, traits FROM characters ORDER BY id")
+        for char_id, book_id, name, description, traits in rows:
+            self._add_row(char_id, book_id, Character(name, description, json.loads(traits)))
+        if self._rows and self.path != ":memory:":
+            self.save_snapshot()
+
+    def _load_snapshot(self) -> bool:
+        try:
+            with open(self.snapshot_path, "rb") as f:
+                data = memoryview(f.read())
+            magic, *state = _SNAPSHOT_HEADER.unpack_from(data, 0)
+        except (OSError, struct.error):
+            return False
+        if magic != _SNAPSHOT_MAGIC or tuple(state) != self._db_state():
+            return False
+        position = _SNAPSHOT_HEADER.size
+        sections = []
+        for _ in range(4):
+            (length,) = _LENGTH.unpack_from(data, position)
+            position += _LENGTH.size
+            sections.append(data[position:position + length])
+            position += length
+        self._table = CharacterTable.from_bytes(sections[0])
+        self._ids.frombytes(sections[1])
+        self._row_books.frombytes(sections[2])
+        book_ids = bytes(sections[3]).decode("utf-8").split("\0")
+        self._trait_keys = [trait_key(trait) for trait in self._table.vocabulary]
+        for row, (char_id, ordinal) in enumerate(zip(self._ids, self._row_books)):
+            book = self._book(book_ids[ordinal])
+            self._row_books[row] = book["ordinal"]
+            self._index_row(char_id, book, row)
+        return True
+
+    def save_snapshot(self):
+        """Write the live rows as a binary snapshot for a fast reopen"""
+        with self._lock:
+            table, ids, ordinals = CharacterTable(), array("q"), array("I")
+            for char_id, row in sorted(self._rows.items()):
+                table.append(self._table[row])
+                ids.append(char_id)
+                ordinals.append(self._row_books[row])
+            state = self._db_state()
+            sections = [table.to_bytes(), ids.tobytes(), ordinals.tobytes(),
+                        "\0".join(self._book_ids).encode("utf-8")]
+        parts = [_SNAPSHOT_HEADER.pack(_SNAPSHOT_MAGIC, *state)]
+        for section in sections:
+            parts += [_LENGTH.pack(len(section)), section]
+        temp_path = f"{self.snapshot_path}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(b"".join(parts))
+        os.replace(temp_path, self.snapshot_path)
+
+    def _book(self, book_id: str, title: str = None) -> dict:
+        book = self._books.get(book_id)
+        if book is None:
+            book = self._books[book_id] = {"title": title or "", "ordinal": len(self._book_ids), "ids": []}
+            self._book_ids.append(book_id)
+        elif title is not None:
+            book["title"] = title
+        return book
+
+    def _add_row(self, char_id: int, book_id: str, char: Character):
+        book = self._book(book_id)
+        row = self._table.append(char)
+        self._ids.append(char_id)
+        self._row_books.append(book["ordinal"])
+        vocabulary = self._table.vocabulary
+        self._trait_keys.extend(trait_key(trait) for trait in vocabulary[len(self._trait_keys):])
+        self._index_row(char_id, book, row)
+
+    def _index_row(self, char_id: int, book: dict, row: int):
+        self._rows[char_id] = row
+        book["ids"].append(char_id)
+        key = name_key(self._table.name(row))
+        self._by_name.setdefault(key, []).append(char_id)
+        for trait in {self._trait_keys[trait_id] for trait_id in self._table.trait_ids(row)}:
+            holders = self._by_trait.get(trait)
+            if holders is None:
+                holders = self._by_trait[trait] = array("Q")
+            holders.append(row)
+        if not self._names_dirty:
+            bisect.insort(self._names, (key, char_id))
+
+    def _unindex(self, char_id: int):
+        key = name_key(self._table.name(self._rows.pop(char_id)))
+        ids = self._by_name[key]
+        ids.remove(char_id)
+        if not ids:
+            del self._by_name[key]
+        if not self._names_dirty:
+            del self._names[bisect.bisect_left(self._names, (key, char_id))]
+
+    def add_book(self, book_id: str, characters: list[Character], title: str = "") -> list[int]:
+        """Store a book's characters, replacing any from an earlier run; returns their ids"""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute("DELETE FROM characters WHERE book_id = ?", (book_id,))
+                self._conn.execute("INSERT OR REPLACE INTO books (book_id, title, added) VALUES (?, ?, ?)",
+                                   (book_id, title, time.time()))
+                ids = []
+                for char in characters:
+                    cursor = self._conn.execute(
+                        "INSERT INTO characters (book_id, name, description, traits) VALUES (?, ?, ?, ?)",
+                        (book_id, char.name, char.description, json.dumps(list(char.traits))))
+                    ids.append(cursor.lastrowid)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            book = self._book(book_id, title)
+            for char_id in book["ids"]:
+                self._unindex(char_id)
+            book["ids"] = []
+            for char_id, char in zip(ids, characters):
+                self._add_row(char_id, book_id, char)
+            return ids
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, char_id: int) -> bool:
+        return char_id in self._rows
+
+    def get(self, char_id: int) -> Character:
+        with self._lock:
+            return self._table[self._rows[char_id]]
+
+    def book_of(self, char_id: int) -> str:
+        with self._lock:
+            return self._book_ids[self._row_books[self._rows[char_id]]]
+
+    def books(self) -> dict[str, str]:
+        """book id -> title"""
+        with self._lock:
+            return {book_id: book["title"] for book_id, book in self._books.items()}
+
+    def book_characters(self, book_id: str) -> list[int]:
+        with self._lock:
+            book = self._books.get(book_id)
+            return list(book["ids"]) if book else []
+
+    def by_name(self, name: str, book_id: str = None) -> list[int]:
+        """Ids of characters with this name (ignoring case and spacing), optionally within one book"""
+        with self._lock:
+            ids = self._by_name.get(name_key(name), ())
+            if book_id is not None:
+                return [char_id for char_id in ids if self.book_of(char_id) == book_id]
+            return list(ids)
+
+    def find(self, name: str, book_id: str = None) -> Character | None:
+        """The first character with this name, or None"""
+        ids = self.by_name(name, book_id)
+        return self.get(ids[0]) if ids else None
+
+    def with_traits(self, *traits: str, book_id: str = None, limit: int = None) -> list[int]:
+        """Ids of characters having every given trait"""
+        with self._lock:
+            postings = [self._by_trait.get(trait_key(trait)) for trait in traits]
+            if not postings or any(p is None for p in postings):
+                return []
+            postings.sort(key=len)
+            rows = set(postings[0]).intersection(*postings[1:])
+            ids = [self._ids[row] for row in rows if self._rows.get(self._ids[row]) == row]
+            if book_id is not None:
+                ids = [char_id for char_id in ids if self.book_of(char_id) == book_id]
+        ids.sort()
+        return ids[:limit] if limit is not None else ids
+
+    def search_names(self, prefix: str, limit: int = 20) -> list[int]:
+        """Ids of characters whose name starts with prefix, in name order"""
+        with self._lock:
+            if self._names_dirty:
+                self._names = sorted((key, char_id) for key, ids in self._by_name.items() for char_id in ids)
+                self._names_dirty = False
+            prefix = name_key(prefix)
+            results = []
+            for index in range(bisect.bisect_left(self._names, (prefix,)), len(self._names)):
+                key, char_id = self._names[index]
+                if not key.startswith(prefix) or len(results) >= limit:
+                    break
+                results.append(char_id)
+            return results
+
+    def close(self):
+        """Refresh the snapshot and close the database; safe to call twice"""
+        with self._lock:
+            if self._conn is None:
+                return
+            if self.path != ":memory:":
+                self.save_snapshot()
+            self._conn.close()
+            self._conn = None
+
+_default_catalog = None
+_default_lock = threading.Lock()
+
+def get_catalog() -> CharacterCatalog:
+    """Process-wide catalog at CHARACTER_CATALOG; closed (and its snapshot refreshed) at exit"""
+    global _default_catalog
+    with _default_lock:
+        if _default_catalog is None:
+            _default_catalog = CharacterCatalog()
+            atexit.register(_default_catalog.close)
+        return _default_catalog
@@ -101,15 +101,31 @@
 
 
 
+import sys
 from dataclasses import dataclass
-from typing import List
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Character:
-    """Represents a character with personality traits"""
+    """Represents a character with personality traits
+
+    Immutable and slotted. Traits given as a list (e.g. parsed from JSON) are
+    stored as a tuple of interned strings, so a trait shared by thousands of
+    characters is stored once; a tuple is kept as given.
+    """
     name: str
     description: str
-    traits: List[str]
+    traits: tuple[str, ...] = ()
+
+    def __post_init__(self):
+        traits = self.traits
+        # Tuples come from code that already shares its strings (e.g. a CharacterTable's vocabulary)
+        if type(traits) is tuple:
+            return
+        try:
+            traits = tuple(map(sys.intern, traits))
+        except TypeError:
+            traits = tuple(sys.intern(str(trait)) for trait in traits)
+        object.__setattr__(self, "traits", traits)
     
     def __str__(self):
-        return f"{self.name} ({', '.join(self.traits)})"
\ No newline at end of file
+        return f"{self.name} ({', '.join(self.traits)})"
@@ -0,0 +1,145 @@
+import sys
+import struct
+from array import array
+from lib.character import Character
+
+MAGIC = b"CHTB"
+VERSION = 1
+_HEADER = struct.Struct("<4sHQQ")  # magic, version, rows, vocabulary size
+_LENGTH = struct.Struct("<Q")
+
+class CharacterTable:
+    """
+    Columnar container for many characters
+
+    Names and descriptions are UTF-8 blobs with offset arrays; traits are ids
+    into a shared vocabulary, stored as one flat id array with per-row offsets.
+    Rows are decoded into Character objects only when read. to_bytes/from_bytes
+    is a flat binary format that loads with a few memory copies.
+    """
+
+    def __init__(self):
+        self.vocabulary = []  # trait id -> trait
+        self._trait_index = {}  # trait -> trait id
+        self._names = bytearray()
+        self._name_offsets = array("Q", [0])
+        self._descriptions = bytearray()
+        self._description_offsets = array("Q", [0])
+        self._trait_ids = array("I")
+        self._trait_offsets = array("Q", [0])
+
+    @classmethod
+    def from_characters(cls, characters) -> "CharacterTable":
+        table = cls()
+        table.extend(characters)
+        return table
+
+    def __len__(self) -> int:
+        return len(self._name_offsets) - 1
+
+    def trait_id(self, trait: str) -> int:
+        """Vocabulary id of a trait, adding it if new"""
+        trait_id = self._trait_index.get(trait)
+        if trait_id is None:
+            trait_id = self._trait_index[trait] = len(self.vocabulary)
+            self.vocabulary.append(sys.intern(trait))
+        return trait_id
+
+    def append(self, character: Character) -> int:
+        """Add a character; returns its row"""
+        self._names += character.name.encode("utf-8")
+        self._name_offsets.append(len(self._names))
+        self._descriptions += character.description.encode("utf-8")
+        self._description_offsets.append(len(self._descriptions))
+        self._trait_ids.extend(self.trait_id(trait) for trait in character.traits)
+        self._trait_offsets.append(len(self._trait_ids))
+        return len(self) - 1
+
+    def extend(self, characters):
+        for character in characters:
+            self.append(character)
+
+    def name(self, row: int) -> str:
+        return self._names[self._name_offsets[row]:self._name_offsets[row + 1]].decode("utf-8")
+
+    def description(self, row: int) -> str:
+        return self._descriptions[self._description_offsets[row]:self._description_offsets[row + 1]].decode("utf-8")
+
+    def trait_ids(self, row: int) -> array:
+        return self._trait_ids[self._trait_offsets[row]:self._trait_offsets[row + 1]]
+
+    def traits(self, row: int) -> tuple[str, ...]:
+        vocabulary = self.vocabulary
+        return tuple(vocabulary[trait_id] for trait_id in self.trait_ids(row))
+
+    def __getitem__(self, row: int) -> Character:
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError("character row out of range")
+        return Character(self.name(row), self.description(row), self.traits(row))
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self[row]
+
+    def nbytes(self) -> int:
+        """Approximate size of the column buffers (excluding the vocabulary strings)"""
+        return (len(self._names) + len(self._descriptions)
+                + sum(column.itemsize * len(column) for column in self._columns()))
+
+    def _columns(self) -> list[array]:
+        return [self._name_offsets, self._description_offsets, self._trait_ids, self._trait_offsets]
+
+    def to_bytes(self) -> bytes:
+        vocabulary = "\0".join(self.vocabulary).encode("utf-8")
+        parts = [_HEADER.pack(MAGIC, VERSION, len(self), len(self.vocabulary))]
+        for blob in (bytes(self._names), bytes(self._descriptions), vocabulary,
+                     *(_little_endian(column) for column in self._columns())):
+            parts.append(_LENGTH.pack(len(blob)))
+            parts.append(blob)
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data) -> "CharacterTable":
+        view = memoryview(data)
+        magic, version, rows, vocabulary_size = _HEADER.unpack_from(view, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a character table (or an unsupported version)")
+        position = _HEADER.size
+        blobs = []
+        for _ in range(7):
+            (length,) = _LENGTH.unpack_from(view, position)
+            position += _LENGTH.size
+            blobs.append(view[position:position + length])
+            position += length
+
+        table = cls()
+        table._names = bytearray(blobs[0])
+        table._descriptions = bytearray(blobs[1])
+        vocabulary = bytes(blobs[2]).decode("utf-8")
+        table.vocabulary = [sys.intern(trait) for trait in vocabulary.split("\0")] if vocabulary_size else []
+        table._trait_index = {trait: trait_id for trait_id, trait in enumerate(table.vocabulary)}
+        for column, blob in zip(table._columns(), blobs[3:]):
+            del column[:]
+            column.frombytes(blob)
+            if sys.byteorder == "big":
+                column.byteswap()
+        if len(table) != rows:
+            raise ValueError("Character table is truncated")
+        return table
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path: str) -> "CharacterTable":
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+def _little_endian(column: array) -> bytes:
+    if sys.byteorder == "big":
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column.tobytes()
@@ -0,0 +1,230 @@
+import threading
+from lib.character import Character
+from lib import extraction
+from lib.book_index import BookLibrary, format_passages
+from lib.cache import get_default_cache
+from lib.catalog import book_key
+from lib.context import ContextWindow, make_model_summarizer
+from lib.conversation_store import conversation_id, create_store
+from lib.llm_client import DEFAULT_MODEL, get_client
+from lib.prompt_cache import PrefixedPrompt, persona_prefix
+from lib.response_cache import get_response_cache
+from lib.streaming import CachedReply, ReplyStream
+from lib.vector_memory import HashingEmbedder, VectorMemory
+from lib.write_behind import WriteBehindQueue
+
+COMMIT_LOCKS = 64
+
+# Per-turn suffix after the persona prefix (lib.prompt_cache.persona_prefix), which already asks for in-character replies
+CHAT_PROMPT = """
+        Passages from the book relevant to this turn:
+        {passages}
+        Current conversation with {user}:
+        {history}
+        Previous conversations with others:
+        {others}
+        """
+
+def greeting_message(char_name: str, user: str) -> dict:
+    """Opening line of a new conversation; persisted together with the first exchange"""
+    return {"role": "assistant", "content": f"Hello {user}! I'm {char_name}. How can I help you?"}
+
+def format_conversation_history(messages):
+    """Format current conversation history"""
+    return "\n".join(f"{msg.get('user', 'User')}: {msg['content']}" for msg in messages)
+
+class ChatTurn:
+    """
+    One streaming chat reply, committed to the conversation when it ends
+
+    Iterates like ReplyStream. When iteration stops (done, failed, cancelled
+    or abandoned) finish() persists the exchange, caches a completed reply and
+    adds it to the character's memory; it is safe to call more than once. The
+    user's message is persisted even if the reply failed before its first chunk.
+    """
+
+    def __init__(self, engine, character: Character, user: str, prompt: str,
+                 stream: ReplyStream, pending: list[dict], meta: dict, summary_state: dict,
+                 cache_window: list[dict] = None, cache_scope: str = None, retrieval_ms: float = None,
+                 retrieval: str = None):
+        self.engine = engine
+        self.character = character
+        self.user = user
+        self.prompt = prompt
+        self.stream = stream
+        self.pending = pending
+        self.meta = meta
+        self.summary_state = summary_state
+        self.cache_window = cache_window  # None for a reply served from the cache
+        self.cache_scope = cache_scope  # None when the reply must not be cached
+        self.retrieval_ms = retrieval_ms  # time spent finding book passages, if any were searched
+        self.retrieval = retrieval  # "ok", "unindexed" for a book_id with no index, None without a book
+        self.message = None
+        self._finished = False
+        self._lock = threading.Lock()
+
+    text = property(lambda self: self.stream.text)
+    error = property(lambda self: self.stream.error)
+    completed = property(lambda self: self.stream.completed)
+    cancelled = property(lambda self: self.stream.cancelled)
+
+    @property
+    def cached(self) -> bool:
+        return self.cache_window is None
+
+    def cancel(self):
+        self.stream.cancel()
+
+    def to_message(self) -> dict | None:
+        return self.stream.to_message()
+
+    def __iter__(self):
+        try:
+            yield from self.stream
+        finally:
+            self.finish()
+
+    def finish(self) -> dict | None:
+        """Persist what was received; returns the assistant message, if any"""
+        with self._lock:
+            if self._finished:
+                return self.message
+            self._finished = True
+            self.message = self.stream.to_message()
+        self.engine.commit_turn(self)
+        return self.message
+
+class ChatEngine:
+    """
+    Chat logic shared by the Streamlit app and the HTTP service
+
+    Owns the model client, conversation store, reply cache, context window,
+    per-character semantic memory and the passage index of every book. Methods are synchronous and thread-safe;
+    the service calls them from a thread pool.
+    """
+
+    def __init__(self, model, store, response_cache=None, context_window: ContextWindow = None,
+                 extraction_cache=None, books: BookLibrary = None):
+        self.model = model
+        self.store = store
+        self.response_cache = response_cache
+        self.context_window = context_window or ContextWindow(make_model_summarizer(model),
+                                                              format_messages=format_conversation_history)
+        self.extraction_cache = extraction_cache
+        self.books = books or BookLibrary()
+        self._memories = {}  # character name -> VectorMemory of exchanges with every user
+        self._memory_lock = threading.Lock()
+        # Striped by conversation id: commits to one conversation read and advance its header in turn
+        self._commit_locks = [threading.Lock() for _ in range(COMMIT_LOCKS)]
+
+    @classmethod
+    def from_env(cls, model_name: str = DEFAULT_MODEL) -> "ChatEngine":
+        """Pooled client, configured store (CONVERSATION_STORE) behind write-behind, default caches"""
+        return cls(get_client(model_name), WriteBehindQueue(create_store()),
+                   response_cache=get_response_cache(), extraction_cache=get_default_cache())
+
+    def close(self):
+        self.store.close()
+
+    def extract_characters(self, text: str) -> list[Character]:
+        """Extract a book's characters and index its passages for chat (see index_book)"""
+        characters = extraction.extract_characters(self.model, text, cache=self.extraction_cache)
+        self.index_book(text)
+        return characters
+
+    def index_book(self, text: str) -> str:
+        """Make a book's passages available to start_turn; returns its book id (lib.catalog.book_key)"""
+        book_id = book_key(text)
+        self.books.add(book_id, text)
+        return book_id
+
+    def history(self, char_name: str, user: str, limit: int = None, before_seq: int = None) -> list[dict]:
+        """Stored messages of a conversation, all of them or the `limit` before `before_seq`"""
+        cid = conversation_id(char_name, user)
+        if limit is None:
+            return self.store.read_range(cid)
+        return self.store.read_tail(cid, limit, before_seq=before_seq)
+
+    def start_turn(self, character: Character, user: str, prompt: str, book_id: str = None) -> ChatTurn:
+        """
+        Build the prompt for a new user message and start streaming the reply
+
+        With the id of an indexed book, the passages most relevant to the
+        message are added to the prompt; the turn's `retrieval` is
+        "unindexed" if the book has no index here (see index_book).
+        """
+        cid = conversation_id(character.name, user)
+        meta = self.store.get_meta(cid)
+        summary_state = {"summary": meta["summary"], "summarized": meta["summarized"]}
+        messages = self.store.read_range(cid, summary_state["summarized"]) if meta["last_seq"] >= 0 else []
+        pending = [] if meta["last_seq"] >= 0 else [greeting_message(character.name, user)]
+        pending.append({"role": "user", "content": prompt, "user": user})
+
+        # Replies are shared by persona, book and recent window, the user's name left out;
+        # a running summary makes the prompt this conversation's own, so it is not cached
+        window = messages + pending
+        scope = book_id or ""
+        cacheable = self.response_cache is not None and not summary_state["summary"]
+        cached = self.response_cache.get(character, window, scope, user=user) if cacheable else None
+        if cached is not None:
+            return ChatTurn(self, character, user, prompt, CachedReply(cached), pending, meta, summary_state)
+
+        others = self.recall_other_conversations(character.name, user, prompt)
+        passages, retrieval_ms = self.books.retrieve(book_id, prompt) if book_id else ([], None)
+        retrieval = ("unindexed" if passages is None else "ok") if book_id else None
+        history = self.context_window.build(window, summary_state, offset=summary_state["summarized"])
+        # Building the history may have started a summary
+        cacheable = cacheable and not summary_state["summary"]
+        context = PrefixedPrompt(persona_prefix(character), CHAT_PROMPT.format(
+            passages=format_passages(passages or []), user=user, history=history, others=others))
+        return ChatTurn(self, character, user, prompt, ReplyStream(self.model, context), pending, meta,
+                        summary_state, cache_window=window, cache_scope=scope if cacheable else None,
+                        retrieval_ms=retrieval_ms, retrieval=retrieval)
+
+    def commit_turn(self, turn: ChatTurn):
+        """
+        Persist a finished turn after whatever was committed since it started
+
+        Turns of one conversation may overlap, so the greeting and summary
+        state are settled against the header at commit time: the greeting is
+        dropped if another turn already opened the conversation, and a summary
+        older than the stored one is not written back.
+        """
+        cid = conversation_id(turn.character.name, turn.user)
+        with self._commit_locks[hash(cid) % COMMIT_LOCKS]:
+            meta = self.store.get_meta(cid)
+            if turn.meta["last_seq"] < 0 <= meta["last_seq"]:
+                turn.pending = turn.pending[1:]
+            if turn.summary_state["summarized"] > meta["summarized"]:
+                meta.update(turn.summary_state)
+            self.store.append(cid, turn.pending + ([turn.message] if turn.message else []), meta=meta)
+        if not turn.message:
+            return
+        if turn.cache_scope is not None and turn.completed and self.response_cache:
+            self.response_cache.put(turn.character, turn.cache_window, turn.text, turn.cache_scope,
+                                    user=turn.user)
+        self.remember_turn(turn.character.name, turn.user, turn.prompt, turn.message["content"])
+
+    def _memory(self, char_name: str) -> VectorMemory:
+        memory = self._memories.get(char_name)
+        if memory is None:
+            memory = self._memories.setdefault(char_name, VectorMemory(HashingEmbedder()))
+        return memory
+
+    def remember_turn(self, char_name: str, user: str, prompt: str, reply: str):
+        """Add a finished exchange to the character's semantic memory"""
+        with self._memory_lock:
+            self._memory(char_name).add([f"{prompt}\n{reply}"],
+                                        [{"user": user, "prompt": prompt, "reply": reply}])
+
+    def recall_other_conversations(self, char_name: str, user: str, query: str, top_k: int = 3) -> str:
+        """Recall the exchanges with other users most relevant to the current message"""
+        with self._memory_lock:
+            # Over-fetch, then drop the current user's own exchanges
+            hits = self._memory(char_name).search([query], top_k * 4)[0]
+        other_convos = [
+            f"\nWith {payload['user']}:\nuser: {payload['prompt']}\nassistant: {payload['reply']}"
+            for payload, score in hits
+            if payload['user'] != user and score > 0
+        ][:top_k]
+        return "\n".join(other_convos) if other_convos else "No previous conversations"
@@ -0,0 +1,76 @@
+from lib.conversation_store import ConversationStore, new_meta
+from lib.vector_memory import HashingEmbedder, normalize_rows
+
+MESSAGES_COLLECTION = "character_messages"
+CONVERSATIONS_COLLECTION = "character_conversations"
+
+class ChromaConversationStore(ConversationStore):
+    """
+    Message-level conversation storage on ChromaDB
+
+    Each message is its own record keyed by conversation id and sequence
+    number, so a turn is a small batched upsert instead of a rewrite of the
+    whole history. A per-conversation header record tracks the last sequence
+    number and the running summary. Reads filter on metadata and page by
+    sequence number, so the UI only fetches the tail it shows.
+    """
+
+    def __init__(self, client, embedder=None):
+        self.messages = client.get_or_create_collection(name=MESSAGES_COLLECTION)
+        self.conversations = client.get_or_create_collection(name=CONVERSATIONS_COLLECTION)
+        # Cheap local embeddings so Chroma never runs its default model on writes
+        self.embedder = embedder or HashingEmbedder()
+
+    @staticmethod
+    def message_id(conversation_id: str, seq: int) -> str:
+        return f"{conversation_id}#{seq:010d}"
+
+    def get_meta(self, conversation_id: str) -> dict:
+        """Header for a conversation: last_seq (-1 if empty), summary, summarized"""
+        result = self.conversations.get(ids=[conversation_id])
+        if result["metadatas"]:
+            return dict(result["metadatas"][0])
+        return new_meta()
+
+    def set_meta(self, conversation_id: str, meta: dict):
+        self.conversations.upsert(ids=[conversation_id], embeddings=[[0.0]], metadatas=[meta])
+
+    def append(self, conversation_id: str, messages: list[dict], meta: dict = None) -> dict:
+        """Append messages in one batched upsert and return the updated header"""
+        meta = meta or self.get_meta(conversation_id)
+        if not messages:
+            return meta
+        start = meta["last_seq"] + 1
+        seqs = range(start, start + len(messages))
+        contents = [msg["content"] for msg in messages]
+        self.messages.upsert(
+            ids=[self.message_id(conversation_id, seq) for seq in seqs],
+            documents=contents,
+            embeddings=normalize_rows(self.embedder.embed(contents)).tolist(),
+            metadatas=[
+                {"conversation_id": conversation_id, "seq": seq, "role": msg["role"], "user": msg.get("user", "")}
+                for seq, msg in zip(seqs, messages)
+            ]
+        )
+        for seq, msg in zip(seqs, messages):
+            msg["seq"] = seq
+        meta = {**meta, "last_seq": start + len(messages) - 1}
+        self.set_meta(conversation_id, meta)
+        return meta
+
+    def read_range(self, conversation_id: str, start_seq: int = 0, end_seq: int = None) -> list[dict]:
+        """Messages with start_seq <= seq < end_seq, in order"""
+        conditions = [{"conversation_id": conversation_id}, {"seq": {"$gte": start_seq}}]
+        if end_seq is not None:
+            conditions.append({"seq": {"$lt": end_seq}})
+        result = self.messages.get(where={"$and": conditions}, include=["documents", "metadatas"])
+        messages = [
+            {"role": meta["role"], "content": document, "seq": meta["seq"],
+             **({"user": meta["user"]} if meta.get("user") else {})}
+            for document, meta in zip(result["documents"], result["metadatas"])
+        ]
+        return sorted(messages, key=lambda msg: msg["seq"])
+
+    def list_conversations(self, prefix: str = "") -> list[str]:
+        ids = self.conversations.get(include=[])["ids"]
+        return sorted(cid for cid in ids if cid.startswith(prefix))
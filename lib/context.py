@@ -0,0 +1,123 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = """
+    You are maintaining a running summary of a conversation between a user and a
+    story character. Update the summary with the new messages below. Keep names,
+    facts, promises and open questions; drop small talk. Reply with the summary only,
+    in at most {max_words} words.
+
+    Current summary:
+    {summary}
+
+    New messages:
+    {messages}
+    """
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English prose)"""
+    return (len(text) + 3) // 4
+
+def default_format(messages: list[dict]) -> str:
+    """Format messages as 'role: content' lines"""
+    return "\n".join(f"{msg['role']}: {msg['content']}" for msg in messages)
+
+def make_model_summarizer(model, max_words: int = 200):
+    """Build a summarize(summary, messages_text) function backed by a Gemini model"""
+    def summarize(summary: str, messages_text: str) -> str:
+        response = model.generate_content(SUMMARY_PROMPT.format(
+            max_words=max_words, summary=summary or "(none yet)", messages=messages_text))
+        return response.text.strip()
+    return summarize
+
+class ContextWindow:
+    """
+    Token-budgeted view of a conversation for prompting
+
+    The last `keep_turns` messages are kept verbatim. Older messages are folded
+    into a running summary, `fold_batch` at a time so the summarizer is not
+    called on every turn. The summary and the index of the last folded message
+    live in a small state dict that callers store next to the conversation.
+    If the summarizer fails (rate limit, timeout), the previous summary is
+    kept and the verbatim window is truncated to fit instead.
+    """
+
+    def __init__(self, summarize, keep_turns: int = 8, fold_batch: int = 8,
+                 token_budget: int = 2000, summary_budget: int = 400,
+                 format_messages=default_format, count_tokens=estimate_tokens):
+        self.summarize = summarize
+        self.keep_turns = keep_turns
+        self.fold_batch = fold_batch
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self.format_messages = format_messages
+        self.count_tokens = count_tokens
+
+    @staticmethod
+    def new_state() -> dict:
+        return {"summary": "", "summarized": 0}
+
+    def _fold(self, messages: list[dict], state: dict, upto: int, offset: int = 0) -> bool:
+        """Fold messages up to absolute position `upto` into the summary; False if the summarizer failed"""
+        if upto <= state["summarized"]:
+            return True
+        new_text = self.format_messages(messages[state["summarized"] - offset:upto - offset])
+        try:
+            summary = self.summarize(state["summary"], new_text)
+        except Exception as e:
+            logger.warning("Could not update the conversation summary, keeping the previous one: %s", e)
+            return False
+        state["summary"] = summary
+        state["summarized"] = upto
+        return True
+
+    def build(self, messages: list[dict], state: dict, offset: int = 0) -> str:
+        """
+        Return the prompt history for messages, updating state in place
+
+        `offset` is the absolute position of messages[0], for callers that only
+        load the not-yet-summarized tail of a stored conversation.
+        """
+        if state["summarized"] < offset:
+            raise ValueError("messages must include everything after the summarized position")
+        total = offset + len(messages)
+
+        # Fold in batches once enough messages have aged out of the verbatim window
+        if total - self.keep_turns - state["summarized"] >= self.fold_batch:
+            self._fold(messages, state, total - self.keep_turns, offset)
+
+        recent = messages[state["summarized"] - offset:]
+        summary = self._fit_summary(state)
+        budget = self.token_budget - self.count_tokens(summary)
+
+        # Enforce the budget on the verbatim part, oldest messages go first
+        history = self.format_messages(recent)
+        folding = True
+        while len(recent) > 1 and self.count_tokens(history) > budget:
+            drop = max(1, len(recent) // 4)
+            if folding and self._fold(messages, state, total - len(recent) + drop, offset):
+                recent = messages[state["summarized"] - offset:]
+                summary = self._fit_summary(state)
+                budget = self.token_budget - self.count_tokens(summary)
+            else:
+                # Without a summarizer the oldest messages are left out of this prompt only;
+                # they stay unsummarized and are folded on a later turn
+                folding = False
+                recent = recent[drop:]
+            history = self.format_messages(recent)
+
+        if summary:
+            return f"Summary of the earlier conversation:\n{summary}\n\nRecent messages:\n{history}"
+        return history
+
+    def _fit_summary(self, state: dict) -> str:
+        """Trim the summary to its share of the budget"""
+        summary = state["summary"]
+        if self.count_tokens(summary) <= self.summary_budget:
+            return summary
+        words = summary.split()
+        while words and self.count_tokens(" ".join(words) + " ...") > self.summary_budget:
+            words = words[:len(words) * 9 // 10]
+        state["summary"] = " ".join(words) + " ..."
+        return state["summary"]
@@ -0,0 +1,220 @@
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+
+# Backend selection, e.g. CONVERSATION_STORE=sqlite CONVERSATION_STORE_PATH=./conversations.db
+DEFAULT_BACKEND = os.getenv("CONVERSATION_STORE", "sqlite")
+DEFAULT_PATHS = {"sqlite": "./conversations.db", "chroma": "./chroma_db"}
+
+def new_meta() -> dict:
+    """Header of an empty conversation"""
+    return {"last_seq": -1, "summary": "", "summarized": 0}
+
+def conversation_id(char_name: str, user: str) -> str:
+    return f"{char_name}-{user}"
+
+class ConversationStore(ABC):
+    """
+    Storage interface for message-level conversations
+
+    Messages are dicts with role/content (and optionally user) plus a `seq`
+    assigned on append. Each conversation has a small header with last_seq
+    and the running summary state. Backends implement get_meta, set_meta,
+    append, read_range and list_conversations; tail reads and cross-user
+    scans are built on top of those.
+    """
+
+    @abstractmethod
+    def get_meta(self, conversation_id: str) -> dict:
+        ...
+
+    @abstractmethod
+    def set_meta(self, conversation_id: str, meta: dict):
+        ...
+
+    @abstractmethod
+    def append(self, conversation_id: str, messages: list[dict], meta: dict = None) -> dict:
+        """Append messages, assigning their seq, and return the updated header"""
+
+    @abstractmethod
+    def read_range(self, conversation_id: str, start_seq: int = 0, end_seq: int = None) -> list[dict]:
+        """Messages with start_seq <= seq < end_seq, in order"""
+
+    @abstractmethod
+    def list_conversations(self, prefix: str = "") -> list[str]:
+        ...
+
+    def read_tail(self, conversation_id: str, limit: int = 50, before_seq: int = None,
+                  meta: dict = None) -> list[dict]:
+        """
+        Up to `limit` messages ending just before `before_seq` (default: the end)
+
+        Pass the first returned message's seq as `before_seq` to page backwards.
+        """
+        if before_seq is None:
+            meta = meta or self.get_meta(conversation_id)
+            before_seq = meta["last_seq"] + 1
+        if before_seq <= 0:
+            return []
+        return self.read_range(conversation_id, max(0, before_seq - limit), before_seq)
+
+    def scan(self, prefix: str = "", limit: int = 3) -> dict[str, list[dict]]:
+        """Last `limit` messages of every conversation whose id starts with prefix"""
+        return {cid: self.read_tail(cid, limit) for cid in self.list_conversations(prefix)}
+
+    def close(self):
+        pass
+
+class MemoryConversationStore(ConversationStore):
+    """In-process store; fastest, but nothing survives a restart"""
+
+    def __init__(self):
+        self._messages = {}
+        self._meta = {}
+        self._lock = threading.Lock()
+
+    def get_meta(self, conversation_id: str) -> dict:
+        return dict(self._meta.get(conversation_id) or new_meta())
+
+    def set_meta(self, conversation_id: str, meta: dict):
+        with self._lock:
+            self._meta[conversation_id] = dict(meta)
+            self._messages.setdefault(conversation_id, [])
+
+    def append(self, conversation_id: str, messages: list[dict], meta: dict = None) -> dict:
+        with self._lock:
+            meta = {**new_meta(), **(meta or self._meta.get(conversation_id) or {})}
+            stored = self._messages.setdefault(conversation_id, [])
+            # Sequence numbers index the list directly
+            if meta["last_seq"] + 1 > len(stored):
+                raise ValueError(f"Gap in conversation {conversation_id}: last_seq is past the stored messages")
+            del stored[meta["last_seq"] + 1:]
+            for msg in messages:
+                msg["seq"] = len(stored)
+                stored.append(dict(msg))
+            meta["last_seq"] = len(stored) - 1
+            self._meta[conversation_id] = meta
+            return dict(meta)
+
+    def read_range(self, conversation_id: str, start_seq: int = 0, end_seq: int = None) -> list[dict]:
+        stored = self._messages.get(conversation_id, [])
+        return [dict(msg) for msg in stored[start_seq:end_seq]]
+
+    def list_conversations(self, prefix: str = "") -> list[str]:
+        return sorted(cid for cid in self._meta if cid.startswith(prefix))
+
+class SQLiteConversationStore(ConversationStore):
+    """SQLite store in WAL mode; one row per message, clustered by (conversation, seq)"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS messages (
+            conversation_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            role TEXT NOT NULL,
+            user TEXT NOT NULL DEFAULT '',
+            content TEXT NOT NULL,
+            PRIMARY KEY (conversation_id, seq)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS conversations (
+            conversation_id TEXT PRIMARY KEY,
+            last_seq INTEGER NOT NULL,
+            summary TEXT NOT NULL DEFAULT '',
+            summarized INTEGER NOT NULL DEFAULT 0
+        );
+    """
+
+    def __init__(self, path: str = DEFAULT_PATHS["sqlite"]):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+        self._lock = threading.Lock()
+
+    def get_meta(self, conversation_id: str) -> dict:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT last_seq, summary, summarized FROM conversations WHERE conversation_id = ?",
+                (conversation_id,)
+            ).fetchone()
+        if row is None:
+            return new_meta()
+        return {"last_seq": row[0], "summary": row[1], "summarized": row[2]}
+
+    def _write_meta(self, conversation_id: str, meta: dict):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO conversations (conversation_id, last_seq, summary, summarized) "
+            "VALUES (?, ?, ?, ?)",
+            (conversation_id, meta["last_seq"], meta.get("summary", ""), meta.get("summarized", 0))
+        )
+
+    def set_meta(self, conversation_id: str, meta: dict):
+        with self._lock:
+            self._write_meta(conversation_id, meta)
+
+    def append(self, conversation_id: str, messages: list[dict], meta: dict = None) -> dict:
+        meta = {**new_meta(), **(meta or self.get_meta(conversation_id))}
+        start = meta["last_seq"] + 1
+        for offset, msg in enumerate(messages):
+            msg["seq"] = start + offset
+        meta["last_seq"] = start + len(messages) - 1
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO messages (conversation_id, seq, role, user, content) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [(conversation_id, msg["seq"], msg["role"], msg.get("user", ""), msg["content"])
+                     for msg in messages]
+                )
+                self._write_meta(conversation_id, meta)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return dict(meta)
+
+    def read_range(self, conversation_id: str, start_seq: int = 0, end_seq: int = None) -> list[dict]:
+        query = "SELECT seq, role, user, content FROM messages WHERE conversation_id = ? AND seq >= ?"
+        params = [conversation_id, start_seq]
+        if end_seq is not None:
+            query += " AND seq < ?"
+            params.append(end_seq)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY seq", params).fetchall()
+        return [
+            {"role": role, "content": content, "seq": seq, **({"user": user} if user else {})}
+            for seq, role, user, content in rows
+        ]
+
+    def list_conversations(self, prefix: str = "") -> list[str]:
+        with self._lock:
+            if not prefix:
+                rows = self._conn.execute("SELECT conversation_id FROM conversations ORDER BY conversation_id")
+            else:
+                # Range scan on the primary key instead of LIKE
+                rows = self._conn.execute(
+                    "SELECT conversation_id FROM conversations "
+                    "WHERE conversation_id >= ? AND conversation_id < ? ORDER BY conversation_id",
+                    (prefix, prefix + "\U0010ffff")
+                )
+            return [row[0] for row in rows.fetchall()]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def create_store(backend: str = None, path: str = None) -> ConversationStore:
+    """Build the configured backend: 'memory', 'sqlite' or 'chroma'"""
+    backend = (backend or DEFAULT_BACKEND).lower()
+    path = path or os.getenv("CONVERSATION_STORE_PATH") or DEFAULT_PATHS.get(backend)
+    if backend == "memory":
+        return MemoryConversationStore()
+    if backend == "sqlite":
+        return SQLiteConversationStore(path)
+    if backend == "chroma":
+        # Imported lazily so the other backends don't need chromadb installed
+        import chromadb
+        from lib.chroma_store import ChromaConversationStore
+        return ChromaConversationStore(chromadb.PersistentClient(path=path))
+    raise ValueError(f"Unknown conversation store backend: {backend}")
@@ -0,0 +1,323 @@
+import re
+import unicodedata
+from functools import lru_cache
+from lib.character import Character
+from lib.vector_memory import HashingEmbedder, normalize_rows
+
+# Titles are stripped from names but kept: "Mr Bennet" and "Mrs Bennet" are different people
+TITLES = {
+    "mr": "mr", "mister": "mr", "mrs": "mrs", "missus": "mrs", "ms": "ms", "miss": "miss",
+    "madam": "madam", "madame": "madam", "dr": "dr", "doctor": "dr", "sir": "sir", "dame": "dame",
+    "lady": "lady", "lord": "lord", "captain": "captain", "capt": "captain", "colonel": "colonel",
+    "col": "colonel", "major": "major", "general": "general", "professor": "professor", "prof": "professor",
+    "rev": "reverend", "reverend": "reverend", "father": "father", "mother": "mother", "aunt": "aunt",
+    "uncle": "uncle", "king": "king", "queen": "queen", "prince": "prince", "princess": "princess",
+    "duke": "duke", "duchess": "duchess", "count": "count", "countess": "countess", "master": "master",
+}
+_LEADING_WORDS = {"the", "old", "young", "little"}
+
+# Common diminutives -> formal first name
+NICKNAMES = {
+    nickname: formal
+    for formal, nicknames in {
+        "elizabeth": "eliza liz lizzy lizzie beth bess bessie betsy betty elsie",
+        "william": "will willy willie bill billy liam",
+        "robert": "rob robbie bob bobby bert",
+        "richard": "rick ricky dick dickie rich richie",
+        "james": "jim jimmy jamie jem",
+        "john": "jack johnny jock",
+        "margaret": "maggie meg peggy marge madge daisy",
+        "catherine": "kate katie kitty cathy kit katherine kathryn",
+        "thomas": "tom tommy",
+        "edward": "ed eddie ned ted teddy",
+        "charles": "charlie chuck chas",
+        "henry": "harry hal hank",
+        "mary": "molly polly mamie",
+        "alexander": "alex alec sandy",
+        "christopher": "chris",
+        "daniel": "dan danny",
+        "michael": "mike mikey mick mickey",
+        "nicholas": "nick nicky",
+        "samuel": "sam sammy",
+        "benjamin": "ben benny",
+        "joseph": "joe joey",
+        "anne": "ann annie nan nancy",
+        "susan": "sue susie",
+        "frederick": "fred freddie freddy",
+        "patrick": "pat paddy",
+        "jonathan": "jon",
+        "matthew": "matt",
+        "peter": "pete",
+        "georgiana": "georgie",
+        "frances": "fanny",
+        "caroline": "carrie",
+        "eleanor": "ellie nell nellie",
+        "theodore": "theo",
+        "abigail": "abby",
+    }.items()
+    for nickname in nicknames.split()
+}
+
+_NON_WORD = re.compile(r"[^\w\s]")
+
+# Pairs scoring at least STRONG_NAME on names alone merge outright; others need
+# NAME_WEIGHT * name + (1 - NAME_WEIGHT) * description similarity >= THRESHOLD
+STRONG_NAME = 0.9
+MIN_NAME = 0.5
+NAME_WEIGHT = 0.7
+THRESHOLD = 0.55
+# A partial name ("Elizabeth", "Miss Bennet") joins the best of several
+# matching characters only when its score leads the runner-up by this much
+AMBIGUITY_MARGIN = 0.15
+# Keys shared by more mentions than this (very common tokens) are not used for blocking
+MAX_BLOCK = 64
+
+def _fold(text: str) -> str:
+    if text.isascii():
+        return text.lower()
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in text if not unicodedata.combining(c)).lower()
+
+@lru_cache(maxsize=65536)
+def soundex(token: str) -> str:
+    """American Soundex code of a word"""
+    codes = {**dict.fromkeys("bfpv", "1"), **dict.fromkeys("cgjkqsxz", "2"), **dict.fromkeys("dt", "3"),
+             "l": "4", **dict.fromkeys("mn", "5"), "r": "6"}
+    letters = [c for c in token if c.isalpha()]
+    if not letters:
+        return token
+    result, previous = letters[0], codes.get(letters[0], "")
+    for c in letters[1:]:
+        code = codes.get(c, "")
+        if code and code != previous:
+            result += code
+        if c not in "hw":
+            previous = code
+    return (result + "000")[:4]
+
+def trigram_similarity(a: str, b: str) -> float:
+    """Jaccard similarity of padded character trigrams"""
+    a, b = f"  {a} ", f"  {b} "
+    grams_a = {a[i:i + 3] for i in range(len(a) - 2)}
+    grams_b = {b[i:i + 3] for i in range(len(b) - 2)}
+    return len(grams_a & grams_b) / len(grams_a | grams_b)
+
+class NameParts:
+    """A name split into title and canonical tokens (diminutives mapped to formal names)"""
+
+    __slots__ = ("raw", "title", "tokens", "key")
+
+    def __init__(self, name: str):
+        words = _NON_WORD.sub(" ", _fold(name)).split()
+        title = None
+        while words and (words[0] in TITLES or words[0] in _LEADING_WORDS) and len(words) > 1:
+            word = words.pop(0)
+            title = TITLES.get(word, title)
+        self.raw = name
+        self.title = title
+        self.tokens = tuple(NICKNAMES.get(word, word) for word in words) if words else ()
+        self.key = " ".join(self.tokens)
+
+    @property
+    def first(self) -> str | None:
+        return self.tokens[0] if len(self.tokens) > 1 else None
+
+    @property
+    def last(self) -> str | None:
+        return self.tokens[-1] if len(self.tokens) > 1 else None
+
+@lru_cache(maxsize=65536)
+def _same_token(a: str, b: str) -> bool:
+    """Equal, or a spelling variant (Bennet / Bennett)"""
+    return a == b or (soundex(a) == soundex(b) and trigram_similarity(a, b) >= 0.5)
+
+def name_similarity(a: NameParts, b: NameParts) -> tuple[float, bool]:
+    """
+    (score in [0, 1], partial) for two names
+
+    partial is True when one name is only part of the other, e.g. a first
+    name or a titled surname against a full name; such matches are accepted
+    only if unambiguous.
+    """
+    if not a.tokens or not b.tokens:
+        return 0.0, False
+    if a.title and b.title and a.title != b.title:
+        return 0.0, False
+    if a.key == b.key:
+        return 1.0, False
+    if len(a.tokens) > 1 and len(b.tokens) > 1:
+        if _same_token(a.last, b.last):
+            # Same family, different first names: different people
+            return (0.95, False) if _same_token(a.first, b.first) else (0.0, False)
+        return trigram_similarity(a.key, b.key), False
+    if len(a.tokens) == 1 and len(b.tokens) == 1:
+        score = 0.8 if _same_token(a.key, b.key) else trigram_similarity(a.key, b.key)
+        return score, False
+    short, full = (a, b) if len(a.tokens) == 1 else (b, a)
+    token = short.tokens[0]
+    if token == full.first:
+        return 0.85, True
+    if token == full.last or _same_token(token, full.last):
+        # "Miss Bennet": surname plus, usually, a title
+        return 0.75, True
+    return 0.0, False
+
+class _Cluster:
+    __slots__ = ("members", "titles", "firsts", "lasts")
+
+    def __init__(self, index: int, parts: NameParts):
+        self.members = [index]
+        self.titles = {parts.title} - {None}
+        self.firsts = {parts.first} - {None}
+        self.lasts = {parts.last} - {None}
+
+    def compatible(self, other: "_Cluster") -> bool:
+        """Merging must not give one character two titles, first names or surnames"""
+        if len(self.titles | other.titles) > 1:
+            return False
+        for mine, theirs in ((self.firsts, other.firsts), (self.lasts, other.lasts)):
+            if mine and theirs and not any(_same_token(x, y) for x in mine for y in theirs):
+                return False
+        return True
+
+    def absorb(self, other: "_Cluster"):
+        self.members += other.members
+        self.titles |= other.titles
+        self.firsts |= other.firsts
+        self.lasts |= other.lasts
+
+class AliasResolver:
+    """
+    Entity resolution for extracted characters
+
+    Names are normalized (accents, punctuation, titles, diminutives), then
+    grouped into candidate blocks by token and Soundex keys so only mentions
+    sharing a key are compared. Each candidate pair is scored on name
+    similarity and, below a strong name match, on description similarity
+    (hashed bag-of-words cosine). Pairs are merged best-first, never joining
+    clusters with conflicting titles, first names or surnames; partial names
+    join a cluster only when one match clearly leads. Merged characters keep
+    the most complete name, the longest description and the union of traits.
+    """
+
+    def __init__(self, threshold: float = THRESHOLD, name_weight: float = NAME_WEIGHT,
+                 max_block: int = MAX_BLOCK, embedder=None):
+        self.threshold = threshold
+        self.name_weight = name_weight
+        self.max_block = max_block
+        self.embedder = embedder or HashingEmbedder()
+        self.aliases = {}  # alias name -> canonical name, from the last resolve()
+
+    def _candidate_pairs(self, parts: list[NameParts], indexes: list[int]) -> set[tuple[int, int]]:
+        blocks = {}
+        for index in indexes:
+            for token in parts[index].tokens:
+                blocks.setdefault(f"t:{token}", []).append(index)
+                blocks.setdefault(f"s:{soundex(token)}", []).append(index)
+        pairs = set()
+        for members in blocks.values():
+            if len(members) > self.max_block:
+                continue
+            for i, a in enumerate(members):
+                for b in members[i + 1:]:
+                    if a != b:
+                        pairs.add((a, b) if a < b else (b, a))
+        return pairs
+
+    def resolve(self, characters: list[Character]) -> list[Character]:
+        """Merge characters that are the same person; keeps first-seen order"""
+        parts = [NameParts(char.name) for char in characters]
+        # Mentions with the same normalized name and title start out merged; only distinct names are compared
+        groups = {}  # (title, key) -> indexes of its mentions
+        for index, name in enumerate(parts):
+            groups.setdefault((name.title, name.key) if name.tokens else index, []).append(index)
+        groups_of = {members[0]: members for members in groups.values()}
+        representatives = sorted(groups_of)
+        scored = []
+        for i, j in self._candidate_pairs(parts, representatives):
+            name_score, is_partial = name_similarity(parts[i], parts[j])
+            if name_score >= MIN_NAME:
+                scored.append((i, j, name_score, is_partial))
+
+        # Descriptions are embedded only for pairs the names alone don't settle
+        compared = sorted({index for i, j, name_score, _ in scored if name_score < STRONG_NAME for index in (i, j)})
+        vectors = {}
+        if compared:
+            descriptions = [max((characters[i].description for i in groups_of[index]), key=len) for index in compared]
+            vectors = dict(zip(compared, normalize_rows(self.embedder.embed(descriptions))))
+
+        full, partial = [], {}  # partial: index of the shorter name -> [(score, other index)]
+        for i, j, name_score, is_partial in scored:
+            score = name_score
+            if name_score < STRONG_NAME:
+                description = max(0.0, float(vectors[i] @ vectors[j]))
+                score = self.name_weight * name_score + (1 - self.name_weight) * description
+            if score < self.threshold:
+                continue
+            if is_partial:
+                short = i if len(parts[i].tokens) < len(parts[j].tokens) else j
+                partial.setdefault(short, []).append((score, i + j - short))
+            else:
+                full.append((score, i, j))
+
+        clusters = {}
+        for index, members in groups_of.items():
+            cluster = clusters[index] = _Cluster(index, parts[index])
+            cluster.members = list(members)
+        owner = list(range(len(parts)))
+
+        def find(index: int) -> int:
+            while owner[index] != index:
+                owner[index] = owner[owner[index]]
+                index = owner[index]
+            return index
+
+        def union(a: int, b: int):
+            root_a, root_b = find(a), find(b)
+            if root_a == root_b or not clusters[root_a].compatible(clusters[root_b]):
+                return
+            if root_b < root_a:
+                root_a, root_b = root_b, root_a
+            owner[root_b] = root_a
+            clusters[root_a].absorb(clusters.pop(root_b))
+
+        for _, i, j in sorted(full, key=lambda pair: (-pair[0], pair[1], pair[2])):
+            union(i, j)
+        for short, matches in sorted(partial.items()):
+            best = {}  # cluster root -> best score
+            for score, other in matches:
+                root = find(other)
+                if root != find(short) and clusters[root].compatible(clusters[find(short)]):
+                    best[root] = max(best.get(root, 0.0), score)
+            ranked = sorted(best.items(), key=lambda item: -item[1])
+            if ranked and (len(ranked) == 1 or ranked[0][1] - ranked[1][1] >= AMBIGUITY_MARGIN):
+                union(short, ranked[0][0])
+
+        self.aliases = {}
+        merged = []
+        for root in sorted(clusters):
+            members = sorted(clusters[root].members)
+            merged.append(self._merge([characters[i] for i in members], [parts[i] for i in members]))
+        return merged
+
+    def _merge(self, characters: list[Character], parts: list[NameParts]) -> Character:
+        if len(characters) == 1:
+            return characters[0]
+        # The first seen of the most complete names
+        best = min(range(len(characters)), key=lambda i: (-len(parts[i].tokens), i))
+        name = characters[best].name
+        description = max((char.description for char in characters), key=len)
+        traits, seen = [], set()
+        for char in characters:
+            for trait in char.traits:
+                if trait.lower() not in seen:
+                    traits.append(trait)
+                    seen.add(trait.lower())
+        for char in characters:
+            if char.name != name:
+                self.aliases[char.name] = name
+        return Character(name, description, traits)
+
+def resolve_characters(characters: list[Character], **kwargs) -> list[Character]:
+    """Merge aliases of the same character (see AliasResolver)"""
+    return AliasResolver(**kwargs).resolve(characters)
@@ -0,0 +1,259 @@
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from lib.character import Character
+from lib.cache import cache_key
+from lib.entity_resolution import resolve_characters
+from lib.json_stream import iter_json_objects
+
+# Chunking defaults - windows overlap so a character introduced across a
+# boundary is still seen whole by at least one call
+CHUNK_SIZE = 20000
+CHUNK_OVERLAP = 1000
+MAX_WORKERS = 4
+
+# Bump whenever EXTRACTION_PROMPT, parsing or merging changes so cached results are invalidated
+PROMPT_VERSION = "3"
+
+EXTRACTION_PROMPT = """
+    Analyze this text and extract significant characters. For each character provide:
+    - name (string)
+    - description (string)
+    - traits (list of strings)
+
+    Return ONLY a valid JSON array of objects formatted EXACTLY like this:
+    [
+        {{
+            "name": "Character Name",
+            "description": "Character's role and key features",
+            "traits": ["trait1", "trait2", "trait3"]
+        }}
+    ]
+
+    Text to analyze:
+    {text}
+    """
+
+def _window_end(buffer: str, chunk_size: int) -> int:
+    """End of the first window in buffer, backed off to a paragraph/line break"""
+    end = min(chunk_size, len(buffer))
+    if end < len(buffer):
+        # Prefer a break in the second half of the window
+        cut = max(buffer.rfind("\n\n", chunk_size // 2, end),
+                  buffer.rfind("\n", chunk_size // 2, end))
+        if cut > 0:
+            end = cut
+    return end
+
+def iter_windows(pieces, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP,
+                 separator: str = ""):
+    """
+    Yield overlapping windows from a stream of text pieces (e.g. PDF pages)
+
+    Only about one window of text is buffered beyond the current piece.
+    """
+    if overlap >= chunk_size:
+        raise ValueError("overlap must be smaller than chunk_size")
+
+    buffer = ""
+    emitted = 0  # leading chars of buffer already sent in a previous window
+    first = True
+    for piece in pieces:
+        buffer += piece if first else separator + piece
+        first = False
+        while len(buffer) > chunk_size:
+            end = _window_end(buffer, chunk_size)
+            yield buffer[:end]
+            start = max(end - overlap, 1)
+            buffer = buffer[start:]
+            emitted = end - start
+    if len(buffer) > emitted:
+        yield buffer
+
+def split_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> list[str]:
+    """Split text into overlapping windows, preferring paragraph breaks"""
+    return list(iter_windows([text], chunk_size, overlap))
+
+def to_character(data: dict) -> Character | None:
+    """Character from one parsed object; None if the model gave it no name"""
+    name = data.get('name') if isinstance(data, dict) else None
+    if name is None or not str(name).strip():
+        return None
+    return Character(
+        name=str(name),
+        description=data.get('description') or 'No description',
+        traits=data.get('traits') or []
+    )
+
+def parse_characters(response_text: str) -> list[Character]:
+    """Parse a model response into Character objects"""
+    characters = (to_character(data) for data in iter_json_objects([response_text]))
+    return [char for char in characters if char is not None]
+
+def extract_chunk_characters(model, chunk: str) -> list[Character]:
+    """Run extraction on a single chunk"""
+    response = model.generate_content(EXTRACTION_PROMPT.format(text=chunk))
+    return parse_characters(response.text)
+
+def stream_chunk_characters(model, chunk: str):
+    """Run extraction on a single chunk, yielding each character as the model finishes writing it"""
+    response = model.generate_content(EXTRACTION_PROMPT.format(text=chunk), stream=True)
+    for data in iter_json_objects(piece.text for piece in response):
+        char = to_character(data)
+        if char is not None:
+            yield char
+
+def merge_characters(results: list[list[Character]], resolve_aliases: bool = True) -> list[Character]:
+    """
+    Merge per-chunk results into one deduplicated list, keeping first-seen order
+
+    Same-named entries are merged first; then, unless resolve_aliases is
+    False, aliases such as "Lizzy" and "Miss Bennet" are folded into the
+    character they refer to (lib.entity_resolution).
+    """
+    merged = {}  # name key -> [name, description, traits, lowercased traits]
+    for characters in results:
+        for char in characters:
+            if not char.name:
+                continue
+            key = " ".join(char.name.lower().split())
+            entry = merged.get(key)
+            if entry is None:
+                merged[key] = [char.name, char.description, list(char.traits), {t.lower() for t in char.traits}]
+                continue
+            if len(char.description) > len(entry[1]):
+                entry[1] = char.description
+            for trait in char.traits:
+                if trait.lower() not in entry[3]:
+                    entry[2].append(trait)
+                    entry[3].add(trait.lower())
+    characters = [Character(name, description, traits) for name, description, traits, _ in merged.values()]
+    return resolve_characters(characters) if resolve_aliases else characters
+
+def extract_characters(model, text: str, chunk_size: int = CHUNK_SIZE,
+                       overlap: int = CHUNK_OVERLAP, max_workers: int = MAX_WORKERS,
+                       extract_fn=extract_chunk_characters, cache=None,
+                       prompt_version: str = PROMPT_VERSION) -> list[Character]:
+    """
+    Map-reduce character extraction over the whole text
+
+    Chunks are extracted concurrently on a bounded thread pool, then merged.
+    A failing chunk is skipped; the error is raised only if every chunk fails.
+    When a cache is given, results are looked up by content hash first.
+    """
+    if not text.strip():
+        return []
+
+    key = None
+    if cache is not None:
+        key = cache_key(text, prompt_version, getattr(model, "model_name", type(model).__name__),
+                        f"{chunk_size}:{overlap}")
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    characters, errors = _extract_windows(model, split_text(text, chunk_size, overlap),
+                                          max_workers, extract_fn)
+    # Don't pin a partial result in the cache
+    if key is not None and characters and not errors:
+        cache.put(key, characters)
+    return characters
+
+def iter_extracted_characters(model, text: str, chunk_size: int = CHUNK_SIZE,
+                              overlap: int = CHUNK_OVERLAP, max_workers: int = MAX_WORKERS,
+                              stream_fn=stream_chunk_characters, cache=None,
+                              prompt_version: str = PROMPT_VERSION):
+    """
+    Like extract_characters, but yields the merged list each time a new character arrives
+
+    Every chunk's response is streamed and parsed incrementally, so the first
+    characters can be shown while the model is still writing the rest. The
+    last list yielded is the complete result. Runs the pool on worker threads;
+    iterate from the thread that renders. Closing the generator early (e.g. a
+    Streamlit rerun) cancels the chunks not yet started and stops the rest at
+    their next character.
+    """
+    if not text.strip():
+        return
+
+    key = None
+    if cache is not None:
+        key = cache_key(text, prompt_version, getattr(model, "model_name", type(model).__name__),
+                        f"{chunk_size}:{overlap}")
+        cached = cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+    windows = split_text(text, chunk_size, overlap)
+    events = queue.Queue()
+    stop = threading.Event()
+
+    def run(index, chunk):
+        try:
+            for char in stream_fn(model, chunk):
+                if stop.is_set():
+                    return
+                events.put((index, char, None))
+            events.put((index, None, None))
+        except Exception as e:
+            events.put((index, None, e))
+
+    results = [[] for _ in windows]
+    errors = []
+    seen = set()
+    characters = []
+    pool = ThreadPoolExecutor(max_workers=max(1, max_workers))
+    try:
+        for index, window in enumerate(windows):
+            pool.submit(run, index, window)
+        pending = len(windows)
+        while pending:
+            index, char, error = events.get()
+            if char is None:
+                pending -= 1
+                if error is not None:
+                    errors.append(error)
+                continue
+            results[index].append(char)
+            name = " ".join(char.name.lower().split())
+            if name not in seen:
+                seen.add(name)
+                characters = merge_characters(results)
+                yield characters
+    finally:
+        # All chunks are done unless the caller stopped iterating; then don't wait for them
+        stop.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    if errors and len(errors) == len(windows):
+        raise errors[0]
+    # Merge in window order so the final list matches extract_characters
+    characters = merge_characters(results)
+    if key is not None and characters and not errors:
+        cache.put(key, characters)
+    yield characters
+
+def _extract_windows(model, windows, max_workers: int, extract_fn):
+    """Run extract_fn over windows on a bounded pool, keeping at most 2x workers in flight"""
+    def run(chunk):
+        try:
+            return extract_fn(model, chunk), None
+        except Exception as e:
+            return [], e
+
+    max_workers = max(1, max_workers)
+    outcomes = []
+    in_flight = deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for window in windows:
+            if len(in_flight) >= 2 * max_workers:
+                outcomes.append(in_flight.popleft().result())
+            in_flight.append(pool.submit(run, window))
+        outcomes.extend(future.result() for future in in_flight)
+
+    errors = [error for _, error in outcomes if error is not None]
+    if errors and len(errors) == len(outcomes):
+        raise errors[0]
+    return merge_characters([characters for characters, _ in outcomes]), errors
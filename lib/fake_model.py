@@ -0,0 +1,174 @@
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import threading
+from collections import Counter
+from lib.llm_client import ChatSession, contents_text
+
+# Pulled from the prompt templates in lib.extraction, character_manager and lib.context
+_PERSONA = re.compile(r"You are ([^,\n]+?)(?:,| with these traits)")
+_TEXT_TO_ANALYZE = re.compile(r"Text to analyze[^:\n]*:\s*(.*)", re.DOTALL)
+_PROPER_NOUN = re.compile(r"\b[A-Z][a-z]{2,}\b")
+_COMMON_CAPITALIZED = frozenset("""
+The This That There Then They When What Where Which While With Without And But For
+From Into Over Under After Before Chapter Page Yes Not Now Our Your Her His She
+""".split())
+
+class FakeAPIError(Exception):
+    """Stand-in for a Google API error; `code` is the HTTP status"""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+class LatencyModel:
+    """Latency distribution in seconds: fixed, uniform, normal or lognormal"""
+
+    def __init__(self, kind: str = "fixed", mean: float = 0.0, spread: float = 0.0, minimum: float = 0.0):
+        if kind not in ("fixed", "uniform", "normal", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {kind}")
+        self.kind = kind
+        self.mean = mean
+        self.spread = spread
+        self.minimum = minimum
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            value = self.mean
+        elif self.kind == "uniform":
+            value = rng.uniform(self.mean - self.spread, self.mean + self.spread)
+        elif self.kind == "normal":
+            value = rng.gauss(self.mean, self.spread)
+        else:
+            # mean/spread are the median and sigma of the underlying normal
+            value = self.mean * rng.lognormvariate(0, self.spread)
+        return max(self.minimum, value)
+
+class FakeModel:
+    """
+    Offline stand-in for gen_ai.GenerativeModel
+
+    Supports generate_content (optionally streamed), start_chat and
+    send_message. Replies are deterministic: each call draws from an RNG
+    seeded by the prompt and how many times that prompt has been seen, so
+    results do not depend on thread scheduling. Latency, chunk cadence and
+    injected errors (429/500/timeouts, before or mid-stream) are configurable.
+    Character-extraction prompts get JSON built from the most frequent proper
+    nouns in the text, or from `characters` if given.
+    """
+
+    def __init__(self, model_name: str = "fake-gemini", seed: int = 0,
+                 latency: LatencyModel = None, first_chunk_latency: LatencyModel = None,
+                 chunk_interval: LatencyModel = None, chunk_chars: int = 24,
+                 error_rates: dict = None, mid_stream_error_rate: float = 0.0, timeout: float = 30.0,
+                 characters: list[dict] = None, max_characters: int = 5, reply_template: str = None):
+        self.model_name = model_name
+        self.seed = seed
+        self.latency = latency or LatencyModel()
+        self.first_chunk_latency = first_chunk_latency or self.latency
+        self.chunk_interval = chunk_interval or LatencyModel()
+        self.chunk_chars = chunk_chars
+        self.error_rates = error_rates or {}  # e.g. {429: 0.05, 500: 0.01, "timeout": 0.01}
+        self.mid_stream_error_rate = mid_stream_error_rate
+        self.timeout = timeout
+        self.characters = characters
+        self.max_characters = max_characters
+        self.reply_template = reply_template or (
+            "*{name} considers your words.* You asked about \"{topic}\". "
+            "Speaking as {name}, I would say the story is not finished with us yet."
+        )
+        self._seen = Counter()
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    @classmethod
+    def from_env(cls, model_name: str = "fake-gemini") -> "FakeModel":
+        """Configure from FAKE_LLM_* variables (latency in milliseconds)"""
+        def latency(prefix, default_ms):
+            return LatencyModel(os.getenv(f"{prefix}_DIST", "lognormal"),
+                                float(os.getenv(f"{prefix}_MS", default_ms)) / 1000,
+                                float(os.getenv(f"{prefix}_SPREAD", "0.3")))
+        rates = {}
+        for key, name in ((429, "FAKE_LLM_429_RATE"), (500, "FAKE_LLM_500_RATE"), ("timeout", "FAKE_LLM_TIMEOUT_RATE")):
+            if os.getenv(name):
+                rates[key] = float(os.getenv(name))
+        return cls(model_name, seed=int(os.getenv("FAKE_LLM_SEED", "0")),
+                   latency=latency("FAKE_LLM_LATENCY", "800"),
+                   first_chunk_latency=latency("FAKE_LLM_TTFT", "300"),
+                   chunk_interval=latency("FAKE_LLM_CHUNK", "40"),
+                   error_rates=rates)
+
+    def _rng(self, prompt: str) -> random.Random:
+        with self._lock:
+            self.calls += 1
+            self._seen[prompt] += 1
+            occurrence = self._seen[prompt]
+        digest = hashlib.blake2b(f"{self.seed}:{occurrence}:{prompt}".encode("utf-8"), digest_size=8).digest()
+        return random.Random(int.from_bytes(digest, "little"))
+
+    def _maybe_fail(self, rng: random.Random):
+        roll = rng.random()
+        for kind, rate in self.error_rates.items():
+            if roll < rate:
+                if kind == "timeout":
+                    time.sleep(min(self.timeout, 0.05))
+                    raise TimeoutError("Fake model call timed out")
+                raise FakeAPIError(kind, "injected error")
+            roll -= rate
+
+    def generate_content(self, contents, stream: bool = False, **kwargs):
+        prompt = contents_text(contents)
+        rng = self._rng(prompt)
+        text = self._reply(prompt, rng)
+        if stream:
+            return self._stream(text, rng)
+        time.sleep(self.latency.sample(rng))
+        self._maybe_fail(rng)
+        return FakeResponse(text)
+
+    def _stream(self, text: str, rng: random.Random):
+        time.sleep(self.first_chunk_latency.sample(rng))
+        self._maybe_fail(rng)
+        fail_at = len(text) // 2 if rng.random() < self.mid_stream_error_rate else None
+        for start in range(0, len(text), self.chunk_chars):
+            if fail_at is not None and start >= fail_at:
+                raise FakeAPIError(500, "injected mid-stream error")
+            if start:
+                time.sleep(self.chunk_interval.sample(rng))
+            yield FakeResponse(text[start:start + self.chunk_chars])
+
+    def start_chat(self, history: list = None) -> ChatSession:
+        return ChatSession(self, history)
+
+    def _reply(self, prompt: str, rng: random.Random) -> str:
+        if "extract" in prompt.lower() and "json" in prompt.lower():
+            return self._extraction_reply(prompt)
+        if "running summary" in prompt:
+            return "The user and the character have been talking about the story so far."
+        persona = _PERSONA.search(prompt)
+        name = persona.group(1).strip() if persona else "the narrator"
+        lines = [line.strip() for line in prompt.strip().splitlines() if line.strip()]
+        topic = lines[-1][:60] if lines else ""
+        return self.reply_template.format(name=name, topic=topic, n=rng.randint(1, 99))
+
+    def _extraction_reply(self, prompt: str) -> str:
+        characters = self.characters
+        if characters is None:
+            match = _TEXT_TO_ANALYZE.search(prompt)
+            text = match.group(1) if match else prompt
+            names = Counter(w for w in _PROPER_NOUN.findall(text) if w not in _COMMON_CAPITALIZED)
+            characters = [
+                {"name": name, "description": f"Appears {count} times in this passage.",
+                 "traits": ["curious", "determined"] if count % 2 else ["guarded", "loyal"]}
+                for name, count in names.most_common(self.max_characters)
+            ]
+        if '"characters"' in prompt:
+            return json.dumps({"characters": characters})
+        return json.dumps(characters)
@@ -25,8 +25,22 @@
 
 
 
-import PyPDF2
-import chardet
+import io
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import codecs
+
+# Parallel PDF extraction settings
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_PAGES_PER_TASK = 16
+PDF_PARALLEL_MIN_PAGES = 64  # below this a process pool costs more than it saves
+
+# Encoding detection settings
+ENCODING_SAMPLE_BYTES = 64 * 1024
+ENCODING_CONFIDENCE = 0.7
+DETECT_BLOCK_SIZE = 4096
+READ_BLOCK_SIZE = 1024 * 1024
 
 def extract_text_from_uploaded_file(uploaded_file):
     """Handle text extraction from uploaded files"""
@@ -39,21 +53,103 @@ def extract_text_from_uploaded_file(uploaded_file):
 
 def extract_pdf_text(pdf_file):
     """Extract text from PDF with PyPDF2"""
-    reader = PyPDF2.PdfReader(pdf_file)
-    text = []
-    for page in reader.pages:
-        page_text = page.extract_text()
+    return "\n".join(iter_pdf_pages(pdf_file))
+
+def iter_pdf_pages(pdf_file, workers: int = PDF_WORKERS, pages_per_task: int = PDF_PAGES_PER_TASK):
+    """
+    Yield the text of each non-empty page in page order
+
+    Large documents are split into page ranges extracted on a process pool;
+    only a bounded number of ranges are in flight at once.
+    """
+    import PyPDF2  # imported on first use; most reruns never touch a PDF
+    data = _read_bytes(pdf_file)
+    reader = PyPDF2.PdfReader(io.BytesIO(data))
+    page_count = len(reader.pages)
+
+    if workers <= 1 or page_count < PDF_PARALLEL_MIN_PAGES:
+        for page in reader.pages:
+            page_text = page.extract_text()
+            if page_text:
+                yield page_text
+        return
+
+    ranges = [(start, min(start + pages_per_task, page_count))
+              for start in range(0, page_count, pages_per_task)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_pdf_worker,
+                             initargs=(data,)) as pool:
+        in_flight = deque()
+        for page_range in ranges:
+            if len(in_flight) >= 2 * workers:
+                yield from in_flight.popleft().result()
+            in_flight.append(pool.submit(_extract_page_range, *page_range))
+        while in_flight:
+            yield from in_flight.popleft().result()
+
+def _read_bytes(pdf_file) -> bytes:
+    """Get the raw bytes of an uploaded file, path or file-like object"""
+    if isinstance(pdf_file, (str, os.PathLike)):
+        with open(pdf_file, "rb") as f:
+            return f.read()
+    if hasattr(pdf_file, "getvalue"):
+        return pdf_file.getvalue()
+    return pdf_file.read()
+
+_worker_reader = None
+
+def _init_pdf_worker(data: bytes):
+    """Open the document once per worker process"""
+    global _worker_reader
+    import PyPDF2
+    _worker_reader = PyPDF2.PdfReader(io.BytesIO(data))
+
+def _extract_page_range(start: int, end: int) -> list[str]:
+    """Extract text for pages [start, end) in a worker process"""
+    texts = []
+    for index in range(start, end):
+        page_text = _worker_reader.pages[index].extract_text()
         if page_text:
-            text.append(page_text)
-    return "\n".join(text)
+            texts.append(page_text)
+    return texts
 
 def extract_text_file_content(text_file):
     """Extract text with encoding detection"""
-    raw_data = text_file.read()
-    encoding = detect_encoding(raw_data)
-    return raw_data.decode(encoding)
-
-def detect_encoding(raw_data):
-    """Auto-detect file encoding"""
-    result = chardet.detect(raw_data)
-    return result['encoding'] if result['confidence'] > 0.7 else 'latin-1'
\ No newline at end of file
+    try:
+        return "".join(iter_text_file(text_file))
+    except UnicodeDecodeError:
+        # The sample was not representative (e.g. ASCII head, Latin-1 body)
+        if not text_file.seekable():
+            raise
+        text_file.seek(0)
+        return "".join(iter_text_file(text_file, encoding='latin-1'))
+
+def iter_text_file(text_file, encoding: str = None, block_size: int = READ_BLOCK_SIZE):
+    """
+    Yield decoded text blocks from a binary file object
+
+    Unless given, the encoding is detected from a bounded sample at the start
+    of the file; the rest is decoded incrementally without holding the raw bytes.
+    """
+    sample = text_file.read(ENCODING_SAMPLE_BYTES)
+    decoder = codecs.getincrementaldecoder(encoding or detect_encoding(sample))()
+    yield decoder.decode(sample)
+    while block := text_file.read(block_size):
+        yield decoder.decode(block)
+    yield decoder.decode(b"", final=True)
+
+def detect_encoding(raw_data, threshold: float = ENCODING_CONFIDENCE):
+    """Auto-detect file encoding from a bounded sample, stopping early once confident"""
+    from chardet.universaldetector import UniversalDetector
+    detector = UniversalDetector()
+    limit = min(len(raw_data), ENCODING_SAMPLE_BYTES)
+    for start in range(0, limit, DETECT_BLOCK_SIZE):
+        detector.feed(raw_data[start:min(start + DETECT_BLOCK_SIZE, limit)])
+        if detector.done:
+            break
+    result = detector.close()
+    if not result['encoding'] or result['confidence'] <= threshold:
+        return 'latin-1'
+    # A pure-ASCII sample says nothing about the rest of a book
+    if result['encoding'] == 'ascii':
+        return 'utf-8'
+    return result['encoding']
@@ -0,0 +1,94 @@
+import re
+import json
+
+# Brackets, quotes and escape pairs are the only characters that change parser state
+_TOKEN = re.compile(r'\\.|[\[\]{}"]', re.DOTALL)
+
+class JSONArrayStream:
+    """
+    Incremental parser for the objects of a JSON array arriving in pieces
+
+    Feed text as it streams in; each object directly inside the first array
+    is returned as soon as its closing brace arrives. Anything before that
+    array is skipped, so markdown fences, leading prose or a wrapper such as
+    {"characters": [...]} are all fine. A malformed object is dropped and
+    counted in `errors` without affecting the ones around it, and a truncated
+    tail only loses the object that was still open.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0  # next unscanned index in _buffer
+        self._depth = 0
+        self._array_depth = None
+        self._object_start = None
+        self._in_string = False
+        self.done = False  # the array has closed
+        self.errors = 0
+
+    @property
+    def started(self) -> bool:
+        return self._array_depth is not None
+
+    def feed(self, text: str) -> list[dict]:
+        """Consume the next piece of text; returns objects completed by it"""
+        if self.done or not text:
+            return []
+        self._buffer += text
+        # A trailing backslash may escape the first character of the next piece
+        end = len(self._buffer) - (1 if self._buffer.endswith("\\") else 0)
+        objects = []
+        for match in _TOKEN.finditer(self._buffer, self._pos, end):
+            self._pos = match.end()
+            token = match.group()
+            if token == '"':
+                # Quotes in prose before the JSON starts are not strings
+                if self._depth:
+                    self._in_string = not self._in_string
+            elif self._in_string or len(token) == 2:
+                continue
+            elif token in "[{":
+                self._depth += 1
+                if token == "[" and self._array_depth is None:
+                    self._array_depth = self._depth
+                elif token == "{" and self._array_depth is not None and self._depth == self._array_depth + 1:
+                    self._object_start = match.start()
+            elif self._depth:
+                if token == "}" and self._object_start is not None and self._depth == self._array_depth + 1:
+                    obj = self._decode(self._buffer[self._object_start:match.end()])
+                    if obj is not None:
+                        objects.append(obj)
+                    self._object_start = None
+                self._depth -= 1
+                if token == "]" and self._array_depth is not None and self._depth < self._array_depth:
+                    self.done = True
+                    break
+        self._compact()
+        return objects
+
+    def _decode(self, raw: str) -> dict | None:
+        try:
+            obj = json.loads(raw)
+        except json.JSONDecodeError:
+            self.errors += 1
+            return None
+        return obj if isinstance(obj, dict) else None
+
+    def _compact(self):
+        """Drop text that can no longer be part of an object"""
+        cut = self._pos if self._object_start is None else self._object_start
+        if cut:
+            self._buffer = self._buffer[cut:]
+            self._pos -= cut
+            if self._object_start is not None:
+                self._object_start -= cut
+
+def iter_json_objects(pieces):
+    """Yield the objects of the first JSON array in a stream of text pieces"""
+    parser = JSONArrayStream()
+    for piece in pieces:
+        yield from parser.feed(piece)
+        if parser.done:
+            break
+    if not parser.started:
+        raise ValueError("Expected a JSON array")
@@ -0,0 +1,368 @@
+import os
+import time
+import queue
+import random
+import inspect
+import logging
+import threading
+from concurrent.futures import Future
+from lib.prompt_cache import PrefixedPrompt
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "gemini-1.5-flash"
+
+# Limits shared by every session in the process
+MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+RATE_PER_SECOND = float(os.getenv("LLM_RATE_PER_SECOND", "4"))
+BURST = int(os.getenv("LLM_BURST", "8"))
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))  # per-call deadline in seconds, retries included; also the longest gap between stream chunks
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+RETRYABLE_NAMES = {"ResourceExhausted", "ServiceUnavailable", "InternalServerError",
+                   "DeadlineExceeded", "TooManyRequests", "GatewayTimeout"}
+
+def contents_text(contents) -> str:
+    """Flatten generate_content contents (str, list of str/parts, or chat dicts) to text"""
+    if isinstance(contents, str):
+        return contents
+    parts = []
+    for item in contents if isinstance(contents, (list, tuple)) else [contents]:
+        if isinstance(item, dict):
+            parts.append(f"[{item.get('role', 'user')}]")
+            parts.extend(str(p) for p in item.get("parts", []))
+        else:
+            parts.append(str(item))
+    return "\n".join(parts)
+
+class DeadlineExceeded(TimeoutError):
+    """The call could not complete within its deadline"""
+
+class SlotLease:
+    """
+    One concurrency slot, held by a call and by every thread still working for it
+
+    The slot is freed when the last holder releases it, so a backend call
+    abandoned at its deadline keeps counting against the limit until it
+    actually returns.
+    """
+
+    def __init__(self, slots):
+        self._slots = slots
+        self._holders = 1
+        self._lock = threading.Lock()
+
+    def share(self) -> "SlotLease":
+        with self._lock:
+            self._holders += 1
+        return self
+
+    def release(self):
+        with self._lock:
+            self._holders -= 1
+            if self._holders == 0:
+                self._slots.release()
+
+def run_before(deadline: float, fn, lease: SlotLease = None):
+    """
+    Run fn on a worker thread; raise DeadlineExceeded if it has not returned by deadline
+
+    The backend may not honour a timeout of its own, so a hung call is left to
+    its daemon thread instead of holding the caller. The thread shares `lease`
+    until fn returns.
+    """
+    future = Future()
+    if lease is not None:
+        lease.share()
+
+    def run():
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            if lease is not None:
+                lease.release()
+    threading.Thread(target=run, name="llm-call", daemon=True).start()
+    try:
+        return future.result(timeout=max(0, deadline - time.monotonic()))
+    except TimeoutError:
+        # Also raised by fn itself (concurrent.futures.TimeoutError is TimeoutError)
+        if future.done():
+            return future.result()
+        raise DeadlineExceeded("Model call did not return before its deadline") from None
+
+def is_retryable(error: Exception) -> bool:
+    """Rate limits, transient server errors and timeouts are worth retrying"""
+    if isinstance(error, DeadlineExceeded):
+        return False
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    if getattr(error, "code", None) in RETRYABLE_STATUS or getattr(error, "status_code", None) in RETRYABLE_STATUS:
+        return True
+    return type(error).__name__ in RETRYABLE_NAMES
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, up to `capacity` banked"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline: float = None):
+        """Block until a token is available; raise DeadlineExceeded if that would pass deadline"""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            if deadline is not None and time.monotonic() + wait > deadline:
+                raise DeadlineExceeded("Rate limit wait would exceed the call deadline")
+            time.sleep(wait)
+
+class LLMClient:
+    """
+    Shared, rate-limited front for a generative model
+
+    Wraps any backend exposing generate_content(contents, stream=..., **kwargs)
+    and offers the same surface, adding a concurrency semaphore, a token-bucket
+    rate limiter, jittered exponential backoff on transient errors and a
+    per-call deadline, enforced even when the backend ignores it. Streaming
+    calls hold their concurrency slot until the stream is exhausted, closed or
+    stalls for `timeout` between chunks; they are retried only before the first chunk.
+    A call given up at its deadline keeps its slot until the backend returns,
+    so at most `max_concurrency` backend calls are ever in flight.
+    PrefixedPrompt contents are sent as their parts, prefix first.
+    """
+
+    def __init__(self, backend, max_concurrency: int = MAX_CONCURRENCY, rate_per_second: float = RATE_PER_SECOND,
+                 burst: int = BURST, max_retries: int = MAX_RETRIES, timeout: float = TIMEOUT,
+                 base_delay: float = 0.5, max_delay: float = 16.0):
+        self.backend = backend
+        self.model_name = getattr(backend, "model_name", type(backend).__name__)
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._bucket = TokenBucket(rate_per_second, burst)
+        self._accepts_request_options = self._supports(backend, "request_options")
+
+    @staticmethod
+    def _supports(backend, parameter: str) -> bool:
+        try:
+            return parameter in inspect.signature(backend.generate_content).parameters
+        except (TypeError, ValueError):
+            return False
+
+    def _backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _call(self, contents, deadline: float, **kwargs):
+        if isinstance(contents, PrefixedPrompt):
+            contents = contents.parts()
+        if self._accepts_request_options and "request_options" not in kwargs:
+            kwargs["request_options"] = {"timeout": max(0.1, deadline - time.monotonic())}
+        return self.backend.generate_content(contents, **kwargs)
+
+    def _with_retries(self, attempt_fn, timeout: float = None, lease: SlotLease = None):
+        deadline = time.monotonic() + (timeout or self.timeout)
+        attempt = 0
+        while True:
+            self._bucket.acquire(deadline)
+            try:
+                return run_before(deadline, lambda: attempt_fn(deadline), lease)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                delay = self._backoff(attempt)
+                if time.monotonic() + delay >= deadline:
+                    raise DeadlineExceeded(f"Gave up after {attempt + 1} attempts: {e}") from e
+                logger.warning("Retrying model call in %.2fs after %s", delay, type(e).__name__)
+                time.sleep(delay)
+                attempt += 1
+
+    def generate_content(self, contents, stream: bool = False, timeout: float = None, **kwargs):
+        if stream:
+            return self._generate_stream(contents, timeout, **kwargs)
+        deadline = time.monotonic() + (timeout or self.timeout)
+        lease = self._acquire(deadline)
+        try:
+            return self._with_retries(lambda d: self._call(contents, d, **kwargs),
+                                      timeout=max(0.1, deadline - time.monotonic()), lease=lease)
+        finally:
+            lease.release()
+
+    def _acquire(self, deadline: float) -> SlotLease:
+        if not self._slots.acquire(timeout=max(0, deadline - time.monotonic())):
+            raise DeadlineExceeded("Timed out waiting for a free model slot")
+        return SlotLease(self._slots)
+
+    def _generate_stream(self, contents, timeout: float = None, **kwargs):
+        timeout = timeout or self.timeout
+        deadline = time.monotonic() + timeout
+        lease = self._acquire(deadline)
+        try:
+            def first_chunk(d):
+                # Errors usually surface on the first chunk, so pull it inside the retry loop
+                chunks = iter(self._call(contents, d, stream=True, **kwargs))
+                return chunks, next(chunks, None)
+            chunks, first = self._with_retries(first_chunk, timeout=max(0.1, deadline - time.monotonic()),
+                                               lease=lease)
+        except BaseException:
+            lease.release()
+            raise
+        return _SlotStream(chunks, first, lease, idle_timeout=timeout)
+
+    def start_chat(self, history: list = None) -> "ChatSession":
+        return ChatSession(self, history)
+
+_END = object()
+
+def _pump_chunks(chunks, out: queue.Queue, stop: threading.Event, lease: SlotLease):
+    """Move chunks into out, then _END or the error, unless the reader stops first"""
+    try:
+        for chunk in chunks:
+            if stop.is_set():
+                return
+            out.put((chunk, None))
+        out.put((_END, None))
+    except BaseException as e:
+        out.put((None, e))
+    finally:
+        lease.release()
+
+class _SlotStream:
+    """Iterator over stream chunks that gives up its slot lease exactly once
+
+    The lease is released when the stream is exhausted, fails, is closed, goes
+    `idle_timeout` seconds without a chunk (DeadlineExceeded), or is garbage
+    collected without ever being iterated. Chunks after the first are read on
+    a daemon thread so a stalled connection cannot block the consumer; that
+    thread shares the lease, so the slot stays taken until the backend lets go.
+    """
+
+    def __init__(self, chunks, first, lease: SlotLease, idle_timeout: float = None):
+        self._chunks = chunks
+        self._first = first
+        self._lease = lease
+        self._idle_timeout = idle_timeout
+        self._queue = None
+        self._stop = threading.Event()
+        self._released = first is None
+        if first is None:
+            lease.release()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._released:
+            raise StopIteration
+        try:
+            if self._first is not None:
+                chunk, self._first = self._first, None
+                return chunk
+            if self._queue is None:
+                # The pump must not reference self, or an abandoned stream would never be collected
+                self._queue = queue.Queue()
+                threading.Thread(target=_pump_chunks,
+                                 args=(self._chunks, self._queue, self._stop, self._lease.share()),
+                                 name="llm-stream", daemon=True).start()
+            try:
+                chunk, error = self._queue.get(timeout=self._idle_timeout)
+            except queue.Empty:
+                raise DeadlineExceeded(f"No stream chunk within {self._idle_timeout}s") from None
+            if error is not None:
+                raise error
+            if chunk is _END:
+                raise StopIteration
+            return chunk
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        if not self._released:
+            self._released = True
+            self._stop.set()
+            self._lease.release()
+
+    def __del__(self):
+        self.close()
+
+class Part:
+    def __init__(self, text: str):
+        self.text = text
+
+class Message:
+    """Chat history entry shaped like the Gemini SDK's Content (role + parts[].text)"""
+
+    def __init__(self, role: str, text: str):
+        self.role = role
+        self.parts = [Part(text)]
+
+class ChatSession:
+    """Multi-turn chat on top of LLMClient.generate_content"""
+
+    def __init__(self, client: LLMClient, history: list = None):
+        self.client = client
+        self.history = list(history or [])
+
+    def send_message(self, content: str, **kwargs):
+        contents = [{"role": msg.role, "parts": [part.text for part in msg.parts]} for msg in self.history]
+        contents.append({"role": "user", "parts": [content]})
+        response = self.client.generate_content(contents, **kwargs)
+        self.history.append(Message("user", content))
+        self.history.append(Message("model", response.text))
+        return response
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def _gemini_backend(model_name: str):
+    """Configure the Gemini SDK once and build a model"""
+    import google.generativeai as gen_ai
+    from lib.startup import load_environment
+    load_environment()
+    gen_ai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+    return gen_ai.GenerativeModel(model_name)
+
+def _fake_backend(model_name: str):
+    """Offline stand-in, for load tests and machines without network access"""
+    from lib.fake_model import FakeModel
+    return FakeModel.from_env(model_name)
+
+BACKENDS = {"gemini": _gemini_backend, "fake": _fake_backend}
+
+def get_client(model_name: str = DEFAULT_MODEL, backend_factory=None) -> LLMClient:
+    """
+    Process-wide client per model name, shared by every Streamlit session and rerun
+
+    The backend comes from backend_factory or LLM_BACKEND (gemini or fake).
+    Setting LLM_CASSETTE records or replays its traffic (see lib.cassette).
+    """
+    with _clients_lock:
+        client = _clients.get(model_name)
+        if client is None:
+            backend_name = os.getenv("LLM_BACKEND", "gemini")
+            if os.getenv("LLM_CASSETTE"):
+                from lib.cassette import CassetteModel
+                backend = CassetteModel.from_env(model_name, backend_factory or BACKENDS[backend_name])
+            elif backend_factory is None:
+                backend = BACKENDS[backend_name](model_name)
+            else:
+                backend = backend_factory(model_name)
+            client = _clients[model_name] = LLMClient(backend)
+        return client
@@ -1,9 +1,14 @@
+import os
+import pickle
+from lib.bm25 import BM25Index
+
 class MemorySystem:
     """Handles conversation memory and recall"""
-    
+
     def __init__(self):
         self.memories = []
-    
+        self.index = BM25Index()
+
     def add_memory(self, user_input: str, response: str, emotion: str, params: dict):
         """Store a conversation memory"""
         self.memories.append({
@@ -12,9 +17,28 @@ class MemorySystem:
             'emotion': emotion,
             'params': params.copy()
         })
-    
-    def query_memory(self, query: str) -> list:
-        """Search for relevant memories"""
-        return [m for m in self.memories 
-               if query.lower() in m['user_input'].lower() or 
-               query.lower() in m['response'].lower()]
\ No newline at end of file
+        self.index.add(f"{user_input}\n{response}")
+
+    def query_memory(self, query: str, top_k: int = 10) -> list:
+        """Return the top_k most relevant memories, best first (BM25 ranking)"""
+        return [self.memories[doc_id] for doc_id, _ in self.index.search(query, top_k)]
+
+    def save(self, path: str):
+        """Write a snapshot of memories and index to disk"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"memories": self.memories, "index": self.index.to_state()}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "MemorySystem":
+        """Restore a snapshot written by save(); returns an empty system if none exists"""
+        system = cls()
+        if not os.path.exists(path):
+            return system
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        system.memories = state["memories"]
+        system.index = BM25Index.from_state(state["index"])
+        return system
@@ -0,0 +1,41 @@
+from functools import lru_cache
+
+PERSONA_PROMPT = """You are {name}, {description}.
+Personality traits: {traits}.
+Respond naturally in character."""
+
+@lru_cache(maxsize=1024)
+def persona_prefix(character, book_context: str = "") -> str:
+    """
+    The static part of a chat prompt: persona, plus any fixed book context
+
+    Memoized per character (Characters are immutable and hashable), so every
+    turn sends a byte-identical prefix.
+    """
+    prefix = PERSONA_PROMPT.format(name=character.name, description=character.description,
+                                   traits=", ".join(character.traits))
+    if book_context:
+        prefix += f"\n\nBackground from the book:\n{book_context}"
+    return prefix
+
+class PrefixedPrompt:
+    """
+    Prompt contents made of a static prefix and a per-turn suffix
+
+    Pass it anywhere generate_content contents go. LLMClient sends it as two
+    parts, prefix first, so providers that cache common prompt prefixes
+    implicitly can reuse the byte-identical persona; other backends see it as
+    text, prefix first.
+    """
+
+    __slots__ = ("prefix", "suffix")
+
+    def __init__(self, prefix: str, suffix: str):
+        self.prefix = prefix
+        self.suffix = suffix
+
+    def parts(self) -> list[str]:
+        return [self.prefix, self.suffix]
+
+    def __str__(self):
+        return f"{self.prefix}\n{self.suffix}"
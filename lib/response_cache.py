@@ -0,0 +1,157 @@
+import os
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from lib.vector_memory import HashingEmbedder, normalize_rows
+
+DEFAULT_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "5000"))
+DEFAULT_TTL = float(os.getenv("RESPONSE_CACHE_TTL", str(24 * 3600)))
+# Cosine similarity for the semantic tier; unset disables it
+DEFAULT_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0") or 0) or None
+DEFAULT_OPT_OUT = {name.strip() for name in os.getenv("RESPONSE_CACHE_OPT_OUT", "").split(",") if name.strip()}
+WINDOW_SIZE = 3
+# Stands in for the user's name in keys and stored replies, so entries are shared between users
+USER_PLACEHOLDER = "<user>"
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+def normalize_prompt(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace"""
+    return " ".join(_PUNCTUATION.sub(" ", text.lower()).split())
+
+def character_key(character) -> str:
+    """Stable identity of a character persona"""
+    persona = "\0".join([character.name, character.description, *character.traits])
+    return hashlib.sha256(persona.encode("utf-8")).hexdigest()[:16]
+
+def scoped_key(character, scope: str = "") -> str:
+    return f"{character_key(character)}/{scope}" if scope else character_key(character)
+
+def _name_pattern(name: str) -> re.Pattern:
+    return re.compile(rf"\b{re.escape(name)}\b")
+
+def prompt_window(messages: list[dict], size: int = WINDOW_SIZE, user: str = None) -> str:
+    """
+    Normalized last `size` messages of a conversation
+
+    A leading assistant greeting is skipped, and the user's name is replaced
+    by USER_PLACEHOLDER, so the same questions from different users share a key.
+    """
+    if messages and messages[0]["role"] == "assistant":
+        messages = messages[1:]
+    window = "\n".join(f"{msg['role']}: {normalize_prompt(msg['content'])}" for msg in messages[-size:])
+    name = normalize_prompt(user) if user else ""
+    return _name_pattern(name).sub(USER_PLACEHOLDER, window) if name else window
+
+class ResponseCache:
+    """
+    Two-tier cache of character replies
+
+    The exact tier is an LRU keyed on character identity, a caller-defined
+    scope (e.g. the book the prompt draws on) and the normalized prompt
+    window. Given the user, their name is left out of the key and stored as a
+    placeholder in the reply, so one user's answer serves the next. The
+    optional similarity tier embeds windows and returns a cached reply for the
+    same character and scope when cosine similarity reaches
+    `similarity_threshold`. Entries expire after `ttl` seconds. Characters in
+    `opt_out` (by name) are never cached.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL,
+                 similarity_threshold: float = DEFAULT_SIMILARITY, embedder=None, opt_out=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.embedder = embedder or HashingEmbedder()
+        self.opt_out = set(DEFAULT_OPT_OUT if opt_out is None else opt_out)
+        self._entries = OrderedDict()  # (scoped character key, window) -> (created, reply)
+        self._vectors = {}  # scoped character key -> {window: vector}
+        self._lock = threading.Lock()
+        self.stats = {"exact_hits": 0, "similar_hits": 0, "misses": 0, "evictions": 0, "skipped": 0}
+
+    def enabled_for(self, character) -> bool:
+        return character.name not in self.opt_out
+
+    def get(self, character, messages: list[dict], scope: str = "", user: str = None) -> str | None:
+        """Cached reply for this character, scope and prompt window, addressed to user, or None"""
+        if not self.enabled_for(character):
+            self.stats["skipped"] += 1
+            return None
+        char_key, window = scoped_key(character, scope), prompt_window(messages, user=user)
+        with self._lock:
+            reply = self._lookup((char_key, window))
+            if reply is not None:
+                self.stats["exact_hits"] += 1
+            elif self.similarity_threshold:
+                reply = self._lookup_similar(char_key, window)
+                if reply is not None:
+                    self.stats["similar_hits"] += 1
+            if reply is None:
+                self.stats["misses"] += 1
+                return None
+        return reply.replace(USER_PLACEHOLDER, user) if user else reply
+
+    def put(self, character, messages: list[dict], reply: str, scope: str = "", user: str = None):
+        """Store reply for the prompt window that produced it (messages without the reply)"""
+        if not self.enabled_for(character):
+            return
+        key = (scoped_key(character, scope), prompt_window(messages, user=user))
+        if user:
+            reply = _name_pattern(user).sub(USER_PLACEHOLDER, reply)
+        vector = None
+        if self.similarity_threshold:
+            vector = normalize_rows(self.embedder.embed([key[1]]))[0]
+        with self._lock:
+            self._entries[key] = (time.time(), reply)
+            self._entries.move_to_end(key)
+            if vector is not None:
+                self._vectors.setdefault(key[0], {})[key[1]] = vector
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+
+    def _lookup(self, key) -> str | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        created, reply = entry
+        if self.ttl and time.time() - created > self.ttl:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return reply
+
+    def _lookup_similar(self, char_key: str, window: str) -> str | None:
+        candidates = self._vectors.get(char_key)
+        if not candidates:
+            return None
+        windows = list(candidates)
+        query = normalize_rows(self.embedder.embed([window]))[0]
+        scores = np.stack([candidates[w] for w in windows]) @ query
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity_threshold:
+            return None
+        return self._lookup((char_key, windows[best]))
+
+    def _remove(self, key):
+        self._entries.pop(key, None)
+        vectors = self._vectors.get(key[0])
+        if vectors is not None:
+            vectors.pop(key[1], None)
+
+    def hit_rate(self) -> float:
+        hits = self.stats["exact_hits"] + self.stats["similar_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+_default_cache = None
+
+def get_response_cache() -> ResponseCache:
+    """Process-wide reply cache configured from the environment"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResponseCache()
+    return _default_cache
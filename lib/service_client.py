@@ -0,0 +1,86 @@
+import json
+from lib.character import Character
+from lib.chat_engine import greeting_message
+from lib.streaming import ReplyStream
+
+class RemoteReply(ReplyStream):
+    """A chat turn streamed from the service over server-sent events"""
+
+    def __init__(self, client, payload: dict):
+        super().__init__(None, None)
+        self._client = client
+        self._payload = payload
+        self.message = None
+        self.retrieval_ms = None
+        self.retrieval = None
+
+    def __iter__(self):
+        try:
+            with self._client.stream("POST", "/chat", json=self._payload) as response:
+                response.raise_for_status()
+                for event, data in _iter_events(response.iter_lines()):
+                    if self.cancelled:
+                        return
+                    if event == "chunk":
+                        self.text += data["text"]
+                        yield data["text"]
+                    elif event == "error":
+                        self.error = RuntimeError(data["message"])
+                    elif event == "done":
+                        self.message = data["message"]
+                        self.completed = data["completed"]
+                        self.retrieval_ms = data.get("retrieval_ms")
+                        self.retrieval = data.get("retrieval")
+        except Exception as e:
+            self.error = e
+
+def _iter_events(lines):
+    """Parse a text/event-stream into (event, decoded data) pairs"""
+    event, data = "message", []
+    for line in lines:
+        if not line:
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[6:].strip()
+        elif line.startswith("data:"):
+            data.append(line[5:].lstrip())
+
+class ChatServiceClient:
+    """
+    Same surface as ChatEngine, backed by the HTTP chat service
+
+    Lets the Streamlit app run as a thin client: set CHAT_SERVICE_URL.
+    """
+
+    def __init__(self, base_url: str, timeout: float = 120.0):
+        import httpx
+        self._http = httpx.Client(base_url=base_url.rstrip("/"), timeout=timeout)
+
+    def close(self):
+        self._http.close()
+
+    def extract_characters(self, text: str) -> list[Character]:
+        response = self._http.post("/characters/extract", json={"text": text})
+        response.raise_for_status()
+        return [Character(**char) for char in response.json()["characters"]]
+
+    def history(self, char_name: str, user: str, limit: int = None, before_seq: int = None) -> list[dict]:
+        # Names go in the query: the server routes on the decoded path, where an escaped "/" splits a segment
+        params = {"character": char_name, "user": user}
+        params.update((k, v) for k, v in (("limit", limit), ("before_seq", before_seq)) if v is not None)
+        response = self._http.get("/conversations/messages", params=params)
+        response.raise_for_status()
+        return response.json()["messages"]
+
+    def start_turn(self, character: Character, user: str, prompt: str, book_id: str = None) -> RemoteReply:
+        return RemoteReply(self._http, {
+            "character": {"name": character.name, "description": character.description,
+                          "traits": list(character.traits)},
+            "user": user,
+            "message": prompt,
+            "book_id": book_id,
+        })
+
+    greeting = staticmethod(greeting_message)
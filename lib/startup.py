@@ -0,0 +1,69 @@
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Imported first by every entry point, so this is close to process start
+PROCESS_STARTED = time.perf_counter()
+
+_env_loaded = False
+_runs = 0
+_lock = threading.Lock()
+
+def load_environment():
+    """Read .env once per process; Streamlit reruns and later callers skip it"""
+    global _env_loaded
+    with _lock:
+        if _env_loaded:
+            return
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
+
+class RunTimer:
+    """
+    Wall-clock phases of one Streamlit script run
+
+    Call mark(label) at the end of each phase (imports, resources, render...)
+    and note(label, ms) for timings measured inside a phase.
+    The first run in a process is the cold start and includes module imports;
+    later runs are the per-interaction overhead.
+    """
+
+    def __init__(self, run: int):
+        self.run = run
+        self.cold = run == 1
+        self.started = time.perf_counter()
+        self.phases = []  # (label, seconds)
+        self.notes = {}  # label -> ms, measured within a phase
+        self._last = self.started
+
+    def mark(self, label: str):
+        now = time.perf_counter()
+        self.phases.append((label, now - self._last))
+        self._last = now
+
+    def note(self, label: str, ms: float):
+        self.notes[label] = ms
+
+    @property
+    def total(self) -> float:
+        return self._last - self.started
+
+    def report(self) -> dict:
+        report = {"run": self.run, "cold start": self.cold, "total ms": round(self.total * 1000, 1)}
+        if self.cold:
+            report["since process start ms"] = round((self._last - PROCESS_STARTED) * 1000, 1)
+        report.update({f"{label} ms": round(seconds * 1000, 1) for label, seconds in self.phases})
+        report.update({f"{label} ms": round(ms, 1) for label, ms in self.notes.items()})
+        logger.info("Script run %s", report)
+        return report
+
+def start_run() -> RunTimer:
+    """Start timing a script run; call at the very top of the entry point"""
+    global _runs
+    with _lock:
+        _runs += 1
+        run = _runs
+    return RunTimer(run)
@@ -0,0 +1,61 @@
+import threading
+
+class ReplyStream:
+    """
+    Streams a model reply chunk by chunk
+
+    Iterating yields text chunks as they arrive and accumulates them in
+    `text`. Errors raised mid-stream are captured in `error` instead of
+    propagating, so whatever arrived before the failure is kept.
+    """
+
+    def __init__(self, model, contents, **kwargs):
+        self._model = model
+        self._contents = contents
+        self._kwargs = kwargs
+        self._cancelled = threading.Event()
+        self.text = ""
+        self.error = None
+        self.completed = False
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        """Stop consuming the stream after the current chunk"""
+        self._cancelled.set()
+
+    def __iter__(self):
+        try:
+            response = self._model.generate_content(self._contents, stream=True, **self._kwargs)
+            for chunk in response:
+                if self.cancelled:
+                    return
+                if chunk.text:
+                    self.text += chunk.text
+                    yield chunk.text
+            self.completed = True
+        except Exception as e:
+            self.error = e
+
+    def to_message(self) -> dict | None:
+        """Conversation entry for what was received, or None if nothing arrived"""
+        if not self.text:
+            return None
+        message = {"role": "assistant", "content": self.text}
+        if not self.completed:
+            message["interrupted"] = True
+        return message
+
+class CachedReply(ReplyStream):
+    """A finished reply (e.g. from the response cache) behind the ReplyStream interface"""
+
+    def __init__(self, text: str):
+        super().__init__(None, None)
+        self._cached = text
+
+    def __iter__(self):
+        self.text = self._cached
+        self.completed = True
+        yield self._cached
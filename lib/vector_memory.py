@@ -0,0 +1,131 @@
+import os
+import json
+import hashlib
+import numpy as np
+from lib.bm25 import tokenize
+
+class HashingEmbedder:
+    """
+    Deterministic, offline text embedder using signed feature hashing
+
+    Unigrams and bigrams are hashed into `dim` buckets with a stable hash
+    (not Python's salted hash), so vectors are identical across processes.
+    """
+
+    def __init__(self, dim: int = 256, cache_size: int = 200000):
+        self.dim = dim
+        self.cache_size = cache_size
+        self._buckets = {}  # feature -> (bucket, sign); vocabularies repeat heavily
+
+    def _bucket(self, feature: str) -> tuple[int, float]:
+        cached = self._buckets.get(feature)
+        if cached is not None:
+            return cached
+        digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+        cached = (digest % self.dim, 1.0 if digest >> 63 else -1.0)
+        if len(self._buckets) < self.cache_size:
+            self._buckets[feature] = cached
+        return cached
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            for feature in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+                bucket, sign = self._bucket(feature)
+                vectors[row, bucket] += sign
+        return vectors
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize rows so a dot product is cosine similarity"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+class VectorMemory:
+    """
+    Embedding-backed memory store with batched similarity search
+
+    Vectors are pre-normalized and kept in one contiguous float32 matrix that
+    grows by doubling. With `path` set the matrix is a memory-mapped file
+    (payloads go to a JSON sidecar), so stores can exceed RAM and survive restarts.
+    """
+
+    def __init__(self, embedder=None, path: str = None, capacity: int = 1024):
+        self.embedder = embedder or HashingEmbedder()
+        self.dim = self.embedder.dim
+        self.path = path
+        self.payloads = []
+        if path and os.path.exists(self._payload_path()):
+            with open(self._payload_path(), encoding="utf-8") as f:
+                self.payloads = json.load(f)
+        self._matrix = self._allocate(max(capacity, len(self.payloads)))
+
+    def __len__(self):
+        return len(self.payloads)
+
+    def _payload_path(self) -> str:
+        return f"{self.path}.json"
+
+    def _allocate(self, capacity: int) -> np.ndarray:
+        if not self.path:
+            return np.zeros((capacity, self.dim), dtype=np.float32)
+        size = capacity * self.dim * 4
+        with open(self.path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        return np.memmap(self.path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+    def _reserve(self, extra: int):
+        needed = len(self.payloads) + extra
+        capacity = self._matrix.shape[0]
+        if needed <= capacity:
+            return
+        capacity = max(1, capacity)  # doubling from a zero capacity would never grow
+        while capacity < needed:
+            capacity *= 2
+        if self.path:
+            self._matrix.flush()
+            del self._matrix
+            self._matrix = self._allocate(capacity)
+        else:
+            grown = np.zeros((capacity, self.dim), dtype=np.float32)
+            grown[:len(self.payloads)] = self._matrix[:len(self.payloads)]
+            self._matrix = grown
+
+    def add(self, texts: list[str], payloads: list[dict] = None):
+        """Embed and store texts; payloads default to {'text': text}"""
+        if not texts:
+            return
+        payloads = payloads or [{"text": text} for text in texts]
+        vectors = normalize_rows(self.embedder.embed(texts))
+        self._reserve(len(texts))
+        start = len(self.payloads)
+        self._matrix[start:start + len(texts)] = vectors
+        self.payloads.extend(payloads)
+
+    def search(self, queries: list[str], top_k: int = 5) -> list[list[tuple[dict, float]]]:
+        """Return the top_k (payload, similarity) pairs for each query, best first"""
+        count = len(self.payloads)
+        if not count or not queries:
+            return [[] for _ in queries]
+
+        query_vectors = normalize_rows(self.embedder.embed(queries))
+        scores = query_vectors @ self._matrix[:count].T  # (queries, entries)
+        k = min(top_k, count)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for row, candidates in enumerate(top):
+            ordered = candidates[np.argsort(-scores[row, candidates], kind="stable")]
+            results.append([(self.payloads[i], float(scores[row, i])) for i in ordered])
+        return results
+
+    def save(self):
+        """Flush the memory-mapped matrix and write the payload sidecar"""
+        if not self.path:
+            raise ValueError("VectorMemory has no backing path")
+        self._matrix.flush()
+        tmp_path = f"{self._payload_path()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.payloads, f)
+        os.replace(tmp_path, self._payload_path())
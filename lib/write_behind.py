@@ -0,0 +1,166 @@
+import time
+import atexit
+import logging
+import threading
+from lib.conversation_store import ConversationStore
+
+logger = logging.getLogger(__name__)
+
+class WriteBehindQueue(ConversationStore):
+    """
+    Background writer in front of a conversation store
+
+    append() assigns sequence numbers and returns immediately; a daemon thread
+    batches pending messages per conversation and flushes them once
+    `max_batch` messages are queued or the oldest has waited `max_delay`
+    seconds. Reads go through the queue and overlay messages that are not
+    stored yet, so callers always see their own writes. Everything still
+    pending is flushed on close() and at interpreter exit.
+    """
+
+    def __init__(self, store, max_batch: int = 64, max_delay: float = 0.25, retry_delay: float = 1.0):
+        self.store = store
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.retry_delay = retry_delay
+        self._pending = {}   # conversation_id -> {"meta": header incl. pending, "messages": [...]}
+        self._inflight = {}  # same shape, currently being written
+        self._count = 0
+        self._oldest = None
+        self._closed = False
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()  # one batch in flight at a time
+        self._thread = threading.Thread(target=self._run, name="conversation-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def append(self, conversation_id: str, messages: list[dict], meta: dict = None) -> dict:
+        """Queue messages for writing and return the updated header"""
+        if self._closed:
+            raise RuntimeError("WriteBehindQueue is closed")
+        meta = meta or self.get_meta(conversation_id)
+        with self._cond:
+            queued = self._pending.get(conversation_id) or self._inflight.get(conversation_id)
+            last_seq = max(meta["last_seq"], queued["meta"]["last_seq"] if queued else -1)
+            for offset, msg in enumerate(messages, start=1):
+                msg["seq"] = last_seq + offset
+            meta = {**meta, "last_seq": last_seq + len(messages)}
+
+            entry = self._pending.setdefault(conversation_id, {"messages": []})
+            entry["messages"].extend(dict(msg) for msg in messages)
+            entry["meta"] = meta
+            self._count += len(messages)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            if self._count >= self.max_batch:
+                self._cond.notify()
+        return dict(meta)
+
+    def get_meta(self, conversation_id: str) -> dict:
+        with self._cond:
+            queued = self._pending.get(conversation_id) or self._inflight.get(conversation_id)
+            if queued:
+                return dict(queued["meta"])
+        return self.store.get_meta(conversation_id)
+
+    def set_meta(self, conversation_id: str, meta: dict):
+        """Header-only update (e.g. a new summary); queued like a zero-message append"""
+        with self._cond:
+            entry = self._pending.setdefault(conversation_id, {"messages": []})
+            entry["meta"] = dict(meta)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+
+    def read_range(self, conversation_id: str, start_seq: int = 0, end_seq: int = None) -> list[dict]:
+        """Stored messages merged with queued ones, start_seq <= seq < end_seq"""
+        overlay = self._overlay(conversation_id)
+        stored_end = end_seq
+        if overlay:
+            first = overlay[0]["seq"]
+            stored_end = first if end_seq is None else min(end_seq, first)
+        stored = []
+        if stored_end is None or stored_end > start_seq:
+            stored = self.store.read_range(conversation_id, start_seq, stored_end)
+        queued = [msg for msg in overlay
+                  if msg["seq"] >= start_seq and (end_seq is None or msg["seq"] < end_seq)]
+        return stored + queued
+
+    def list_conversations(self, prefix: str = "") -> list[str]:
+        with self._cond:
+            queued = {cid for source in (self._inflight, self._pending) for cid in source if cid.startswith(prefix)}
+        return sorted(queued.union(self.store.list_conversations(prefix)))
+
+    def _overlay(self, conversation_id: str) -> list[dict]:
+        with self._cond:
+            messages = []
+            for source in (self._inflight, self._pending):
+                if conversation_id in source:
+                    messages.extend(dict(msg) for msg in source[conversation_id]["messages"])
+        return messages
+
+    def flush(self):
+        """Write everything queued so far, blocking until done"""
+        with self._write_lock:
+            with self._cond:
+                batch = self._take_locked()
+            self._write(batch)
+
+    def close(self):
+        """Stop the writer thread and flush durably"""
+        if self._closed:
+            return
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self.flush()
+
+    def _take_locked(self) -> dict:
+        batch, self._pending = self._pending, {}
+        self._inflight = batch
+        self._count = 0
+        self._oldest = None
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed:
+                    if self._count >= self.max_batch:
+                        break
+                    if self._oldest is not None:
+                        remaining = self.max_delay - (time.monotonic() - self._oldest)
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    else:
+                        self._cond.wait()
+                if self._closed:
+                    return
+            self.flush()
+
+    def _write(self, batch: dict):
+        failed = {}
+        for conversation_id, entry in batch.items():
+            messages = entry["messages"]
+            try:
+                if messages:
+                    base = {**entry["meta"], "last_seq": messages[0]["seq"] - 1}
+                    self.store.append(conversation_id, messages, meta=base)
+                else:
+                    self.store.set_meta(conversation_id, entry["meta"])
+            except Exception:
+                logger.exception("Failed to persist conversation %s, will retry", conversation_id)
+                failed[conversation_id] = entry
+
+        with self._cond:
+            self._inflight = {}
+            # Requeue failures ahead of anything appended meanwhile
+            for conversation_id, entry in failed.items():
+                self._count += len(entry["messages"])
+                newer = self._pending.get(conversation_id)
+                if newer:
+                    entry = {"messages": entry["messages"] + newer["messages"], "meta": newer["meta"]}
+                self._pending[conversation_id] = entry
+            if failed:
+                self._oldest = time.monotonic() + self.retry_delay
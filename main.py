@@ -1,12 +1,16 @@
-import os
+# Started before the other imports so a cold start's import time is counted
+from lib.startup import start_run, load_environment
+run_timer = start_run()
+
 
 import streamlit as st
-from dotenv import load_dotenv
-import google.generativeai as gen_ai
+from lib.llm_client import get_client
+from ui import display_chat_window, show_run_timings
 
 
 # Load environment variables
-load_dotenv()
+load_environment()
+run_timer.mark("imports")
 
 # Configure Streamlit page settings
 st.set_page_config(
@@ -15,11 +19,9 @@ st.set_page_config(
     layout="centered",  # Page layout option
 )
 
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-
-# Set up Google Gemini-Pro AI model
-gen_ai.configure(api_key=GOOGLE_API_KEY)
-model = gen_ai.GenerativeModel('gemini-1.5-flash')
+# Set up the shared Gemini-Pro client (rate limited, retried)
+model = get_client('gemini-1.5-flash')
+run_timer.mark("resources")
 
 
 
@@ -39,10 +41,12 @@ if "chat_session" not in st.session_state:
 # Display the chatbot's title on the page
 st.title("🤖 Gemini Pro - ChatBot")
 
-# Display the chat history
-for message in st.session_state.chat_session.history:
-    with st.chat_message(translate_role_for_streamlit(message.role)):
-        st.markdown(message.parts[0].text)
+# Display the latest page of chat history; older pages load on demand
+display_chat_window(
+    [{"role": translate_role_for_streamlit(message.role), "content": message.parts[0].text}
+     for message in st.session_state.chat_session.history],
+    key="history_chat_session",
+)
 
 # Input field for user's message
 user_prompt = st.chat_input("Ask Gemini-Pro...")
@@ -56,3 +60,6 @@ if user_prompt:
     # Display Gemini-Pro's response
     with st.chat_message("assistant"):
         st.markdown(gemini_response.text)
+
+run_timer.mark("render")
+show_run_timings(run_timer)
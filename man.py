@@ -1,73 +1,54 @@
-import os
-import json
+# Started before the other imports so a cold start's import time is counted
+from lib.startup import start_run, load_environment
+run_timer = start_run()
+
 import streamlit as st
-from dotenv import load_dotenv
-import google.generativeai as gen_ai
 from lib.character import Character
+from lib import extraction
+from lib.cache import get_default_cache
+from lib.catalog import book_key, get_catalog
+from lib.context import ContextWindow, make_model_summarizer
 from lib.file_processor import extract_text_from_uploaded_file
+from lib.llm_client import get_client
+from lib.prompt_cache import PrefixedPrompt, persona_prefix
+from lib.streaming import ReplyStream
+from lib.vector_memory import HashingEmbedder, VectorMemory
+from ui import display_chat_window, stream_assistant_reply, show_run_timings
 
 # Load environment and configuration
-load_dotenv()
+load_environment()
+run_timer.mark("imports")
+
+# Shared Gemini client: configured once per process, with concurrency and rate limits
+model = get_client('gemini-1.5-flash')
 
-# Configure Gemini-Pro
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-gen_ai.configure(api_key=GOOGLE_API_KEY)
-model = gen_ai.GenerativeModel('gemini-1.5-flash')
+# Persistent catalog of every extracted character, indexed by id, name and trait
+catalog = get_catalog()
+run_timer.mark("resources")
 
 # UI Configuration
 st.set_page_config(page_title="AI Character Simulator", page_icon=":brain:", layout="wide")
 
-def extract_characters(text: str) -> list[Character]:
-    """Extract characters from text using Gemini with robust JSON handling"""
+def extract_characters(text: str, placeholder=None) -> list[Character]:
+    """Extract characters from the whole text using chunked Gemini calls
+
+    With a placeholder, names are listed there as soon as the model writes them.
+    """
     if not text.strip():
         return []
 
-    prompt = f"""
-    Analyze this text and extract significant characters. For each character provide:
-    - name (string)
-    - description (string)
-    - traits (list of strings)
-    
-    Return ONLY a valid JSON array of objects formatted EXACTLY like this:
-    [
-        {{
-            "name": "Character Name",
-            "description": "Character's role and key features",
-            "traits": ["trait1", "trait2", "trait3"]
-        }}
-    ]
-    
-    Text to analyze:
-    {text[:20000]}  # First 20k chars for demo
-    """
-    
+    characters = []
     try:
-        response = model.generate_content(prompt)
-        
-        # First try to parse directly
-        try:
-            characters_data = json.loads(response.text)
-        except json.JSONDecodeError:
-            # If direct parse fails, try to extract JSON from markdown
-            json_str = response.text.strip().strip('```json').strip('```').strip()
-            characters_data = json.loads(json_str)
-            
-        # Validate the structure
-        if not isinstance(characters_data, list):
-            raise ValueError("Expected list of characters")
-            
-        return [
-            Character(
-                name=char.get('name', 'Unnamed'),
-                description=char.get('description', 'No description'),
-                traits=char.get('traits', [])
-            ) for char in characters_data
-        ]
-        
+        for characters in extraction.iter_extracted_characters(model, text, cache=get_default_cache()):
+            if placeholder is not None:
+                placeholder.markdown("Found so far: " + ", ".join(char.name for char in characters))
+        return characters
     except Exception as e:
         st.error(f"Failed to extract characters. Please try again. Error: {str(e)}")
-        st.text_area("Debug - AI Response", response.text, height=200)
-        return []
+        return characters
+    finally:
+        if placeholder is not None:
+            placeholder.empty()
 
 def setup_sidebar():
     """Configure the sidebar UI for character selection"""
@@ -75,12 +56,14 @@ def setup_sidebar():
     
     input_method = st.radio("Input method:", ("Paste text", "Upload file"), index=0)
     book_text = ""
+    title = "Pasted text"
     
     if input_method == "Paste text":
         book_text = st.text_area("Paste book text:", height=200, key="paste_area")
     else:
         uploaded_file = st.file_uploader("Upload file:", type=["txt", "pdf"])
         if uploaded_file:
+            title = uploaded_file.name
             with st.spinner("Extracting text..."):
                 book_text = extract_text_from_uploaded_file(uploaded_file)
                 if book_text:
@@ -88,19 +71,49 @@ def setup_sidebar():
     
     if st.button("Analyze for Characters") and book_text:
         with st.spinner("Identifying characters..."):
-            st.session_state.characters = extract_characters(book_text)
+            st.session_state.characters = extract_characters(book_text, st.empty())
             if st.session_state.characters:
+                st.session_state.book_id = book_key(book_text)
+                catalog.add_book(st.session_state.book_id, st.session_state.characters, title=title)
+                st.session_state.current_character = st.session_state.characters[0]
+                # Start the selectors on the new book's first character
+                for key in ("char_select", "current_character_select"):
+                    st.session_state.pop(key, None)
                 st.success(f"Found {len(st.session_state.characters)} characters")
 
+def find_character(name: str) -> Character:
+    """Look up a character of the current book by name"""
+    return catalog.find(name, st.session_state.get("book_id"))
+
+def render_catalog_search():
+    """Find characters across every processed book by name prefix or trait"""
+    with st.expander("🔎 Character catalog", expanded=False):
+        st.caption(f"{len(catalog)} characters from {len(catalog.books())} books")
+        prefix = st.text_input("Name starts with", key="catalog_prefix")
+        trait = st.text_input("Has trait", key="catalog_trait")
+        if trait:
+            ids = catalog.with_traits(trait)
+            if prefix:
+                ids = [char_id for char_id in ids if catalog.get(char_id).name.lower().startswith(prefix.lower())]
+            ids = ids[:20]
+        elif prefix:
+            ids = catalog.search_names(prefix)
+        else:
+            return
+        titles = catalog.books()
+        for char_id in ids:
+            char = catalog.get(char_id)
+            if st.button(f"{char.name} · {titles.get(catalog.book_of(char_id), '')}", key=f"catalog_{char_id}"):
+                st.session_state.current_character = char
+                st.rerun()
+
 def render_character_selection():
     """Show character selection dropdown"""
     if st.session_state.characters:
         st.subheader("👥 Select Character")
         character_names = [char.name for char in st.session_state.characters]
         selected = st.selectbox("Choose a character:", character_names, key="char_select")
-        st.session_state.selected_character = next(
-            char for char in st.session_state.characters if char.name == selected
-        )
+        st.session_state.selected_character = find_character(selected)
         
         # Show character info
         char = st.session_state.selected_character
@@ -125,28 +138,17 @@ def render_chat_interface():
         ]
     
     # Display chat messages
-    for msg in st.session_state.messages:
-        st.chat_message(msg["role"]).write(msg["content"])
+    display_chat_window(st.session_state.messages, key="history_messages")
     
     # Handle user input
     if prompt := st.chat_input(f"Talk to {char.name}..."):
         st.session_state.messages.append({"role": "user", "content": prompt})
         st.chat_message("user").write(prompt)
         
-        # Generate character response
-        with st.spinner(f"{char.name} is thinking..."):
-            try:
-                context = f"""
-                You are {char.name}, {char.description}.
-                Personality traits: {', '.join(char.traits)}.
-                Respond naturally in character.
-                """
-                response = model.generate_content([context, prompt])
-                msg = response.text
-                st.session_state.messages.append({"role": "assistant", "content": msg})
-                st.chat_message("assistant").write(msg)
-            except Exception as e:
-                st.error(f"Error generating response: {e}")
+        # Stream character response; the persona is a fixed prefix, only the message changes
+        with st.chat_message("assistant"):
+            stream_assistant_reply(ReplyStream(model, PrefixedPrompt(persona_prefix(char), prompt)),
+                                   st.session_state.messages)
 
 
 def main():
@@ -156,6 +158,10 @@ def main():
         st.session_state.characters = []
     if "all_conversations" not in st.session_state:
         st.session_state.all_conversations = {}  # Format: {character_name: {user: [messages]}}
+    if "conversation_summaries" not in st.session_state:
+        st.session_state.conversation_summaries = {}  # Format: {character_name: {user: summary state}}
+    if "character_memories" not in st.session_state:
+        st.session_state.character_memories = {}  # Format: {character_name: VectorMemory}
     if "current_character" not in st.session_state:
         st.session_state.current_character = None
     if "current_user" not in st.session_state:
@@ -177,19 +183,15 @@ def main():
         
         # Character selection
         if st.session_state.characters:
-            character_names = [char.name for char in st.session_state.characters]
+            # The selection persists under its key, so no index lookup is needed
             selected_char = st.selectbox(
                 "Select Character",
-                character_names,
-                index=character_names.index(st.session_state.current_character.name) 
-                if st.session_state.current_character else 0
+                [char.name for char in st.session_state.characters],
+                key="current_character_select"
             )
             
             if st.button("Switch Character"):
-                st.session_state.current_character = next(
-                    char for char in st.session_state.characters 
-                    if char.name == selected_char
-                )
+                st.session_state.current_character = find_character(selected_char)
                 st.rerun()
 
             st.divider()
@@ -197,6 +199,8 @@ def main():
             for char in st.session_state.characters:
                 st.write(f"- {char.name}")
 
+        render_catalog_search()
+
     # Main Chat Area
     st.title(f"💬 {st.session_state.current_user}'s Conversation")
     
@@ -221,8 +225,7 @@ def main():
 
     # Display conversation history
     messages = st.session_state.all_conversations[char_name][st.session_state.current_user]
-    for msg in messages:
-        st.chat_message(msg["role"]).write(msg["content"])
+    display_chat_window(messages, key=f"history_{char_name}-{st.session_state.current_user}")
 
     # Handle user input
     if prompt := st.chat_input(f"Message {char_name}..."):
@@ -230,33 +233,24 @@ def main():
         messages.append({"role": "user", "content": prompt, "user": st.session_state.current_user})
         st.chat_message("user").write(f"{st.session_state.current_user}: {prompt}")
         
-        # Generate character response
-        with st.spinner(f"{char_name} is thinking..."):
-            try:
-                char = st.session_state.current_character
-                
-                # Build context with character info and full conversation history
-                context = f"""
-                You are {char.name}, {char.description}.
-                Personality traits: {', '.join(char.traits)}.
-                
-                Current conversation with {st.session_state.current_user}:
-                {format_conversation_history(messages)}
-                
-                Previous conversations with others:
-                {format_other_conversations(char_name)}
-                
-                Respond naturally in character, remembering you've spoken with others before.
-                """
-                
-                response = model.generate_content(context)
-                assistant_msg = response.text
-                
-                messages.append({"role": "assistant", "content": assistant_msg})
-                st.chat_message("assistant").write(assistant_msg)
-                
-            except Exception as e:
-                st.error(f"Error generating response: {str(e)}")
+        # Stream character response
+        char = st.session_state.current_character
+        
+        # Persona prefix plus this turn's conversation history
+        context = PrefixedPrompt(persona_prefix(char), f"""
+        Current conversation with {st.session_state.current_user}:
+        {build_history(char_name, messages)}
+        
+        Previous conversations with others:
+        {format_other_conversations(char_name, prompt)}
+        
+        Remember you've spoken with others before.
+        """)
+        
+        with st.chat_message("assistant"):
+            reply = stream_assistant_reply(ReplyStream(model, context), messages)
+        if reply:
+            remember_turn(char_name, prompt, reply)
 
 def format_conversation_history(messages):
     """Format current conversation history"""
@@ -266,16 +260,41 @@ def format_conversation_history(messages):
         if msg['role'] != "system"
     )
 
-def format_other_conversations(char_name):
-    """Format conversations with other users"""
-    other_convos = []
-    for user, messages in st.session_state.all_conversations[char_name].items():
-        if user != st.session_state.current_user:
-            convo = f"\nConversation with {user}:\n"
-            convo += "\n".join(f"{msg['role']}: {msg['content']}" for msg in messages[-3:])  # Show last 3 messages
-            other_convos.append(convo)
+def build_history(char_name, messages):
+    """Token-budgeted history: recent turns verbatim plus a running summary"""
+    summaries = st.session_state.conversation_summaries.setdefault(char_name, {})
+    state = summaries.setdefault(st.session_state.current_user, ContextWindow.new_state())
+    return context_window.build(messages, state)
+
+def get_character_memory(char_name):
+    """Semantic memory of everything said to a character, across users"""
+    memories = st.session_state.character_memories
+    if char_name not in memories:
+        memories[char_name] = VectorMemory(HashingEmbedder())
+    return memories[char_name]
+
+def remember_turn(char_name, prompt, reply):
+    """Add a finished exchange to the character's semantic memory"""
+    get_character_memory(char_name).add(
+        [f"{prompt}\n{reply['content']}"],
+        [{"user": st.session_state.current_user, "prompt": prompt, "reply": reply['content']}]
+    )
+
+def format_other_conversations(char_name, query, top_k=3):
+    """Recall the exchanges with other users most relevant to the current message"""
+    memory = get_character_memory(char_name)
+    # Over-fetch, then drop the current user's own exchanges
+    hits = memory.search([query], top_k * 4)[0]
+    other_convos = [
+        f"\nConversation with {payload['user']}:\nuser: {payload['prompt']}\nassistant: {payload['reply']}"
+        for payload, score in hits
+        if payload['user'] != st.session_state.current_user and score > 0
+    ][:top_k]
     return "\n".join(other_convos) if other_convos else "No previous conversations with others"
 
+context_window = ContextWindow(make_model_summarizer(model), format_messages=format_conversation_history)
+
 if __name__ == "__main__":
     main()
-
+    run_timer.mark("render")
+    show_run_timings(run_timer)
@@ -0,0 +1,94 @@
+"""Benchmark alias resolution: time, and pairwise precision/recall against known identities
+
+Usage: python -m scripts.bench_aliases [--characters 200] [--mentions 1000 5000 20000]
+
+Synthetic characters get a unique full name and a title; each mention uses
+one of their forms (full name, first name, a diminutive, title plus
+surname, a misspelled surname) that names no other character, with a
+paraphrased description, as per-chunk extraction produces them.
+"""
+import sys
+import time
+import random
+import argparse
+from itertools import combinations
+from lib.character import Character
+from lib.entity_resolution import NICKNAMES, AliasResolver
+
+FIRST_NAMES = sorted(set(NICKNAMES.values()) | {"jane", "lydia", "emma", "harriet", "edmund", "marianne",
+                                                 "elinor", "louisa", "isabella", "henrietta"})
+SURNAMES = ["bennet", "darcy", "bingley", "woodhouse", "knightley", "price", "bertram", "dashwood", "ferrars",
+            "elliot", "wentworth", "musgrove", "tilney", "thorpe", "morland", "crawford", "churchill", "weston",
+            "lucas", "collins", "wickham", "gardiner", "brandon", "willoughby", "palmer", "jennings", "steele"]
+ROLES = ["sister", "father", "officer", "clergyman", "heiress", "neighbour", "cousin", "friend", "suitor", "widow"]
+DIMINUTIVES = {}
+for nickname, formal in NICKNAMES.items():
+    DIMINUTIVES.setdefault(formal, []).append(nickname)
+
+def make_mentions(characters: int, mentions: int, seed: int = 0) -> tuple[list[Character], list[int]]:
+    """Mentions and the identity each one refers to"""
+    rng = random.Random(seed)
+    # Full names are unique within a book; first names and surnames are shared
+    names = rng.sample([(first, last) for first in FIRST_NAMES for last in SURNAMES], characters)
+    people = []
+    for first, last in names:
+        title = rng.choice(["Mr", "Mrs", "Miss", "Captain", None])
+        people.append((first.title(), last.title(), title, rng.choice(ROLES), f"{rng.choice(SURNAMES)} estate"))
+    forms = []
+    for first, last, title, _, _ in people:
+        variants = [f"{first} {last}", first, f"{first} {last[:-1]}{last[-1] * 2}"]
+        variants += [f"{title} {last}"] if title else []
+        variants += [d.title() for d in DIMINUTIVES.get(first.lower(), [])[:2]]
+        forms.append(variants)
+    # As in a novel, a short form is only used when it names a single character
+    uses = {}
+    for variants in forms:
+        for form in set(variants):
+            uses[form] = uses.get(form, 0) + 1
+    forms = [[form for form in variants if uses[form] == 1] for variants in forms]
+
+    result, identities = [], []
+    for _ in range(mentions):
+        identity = rng.randrange(characters)
+        _, _, _, role, home = people[identity]
+        name = rng.choice(forms[identity])
+        description = f"The {role} from the {home}, {rng.choice(['often seen', 'rarely seen', 'known'])} in town"
+        result.append(Character(name, description, [role]))
+        identities.append(identity)
+    return result, identities
+
+def pair_scores(clusters: list[list[int]], identities: list[int]) -> tuple[float, float]:
+    """Pairwise precision and recall of mention clusters"""
+    predicted = {pair for cluster in clusters for pair in combinations(sorted(cluster), 2)}
+    by_identity = {}
+    for index, identity in enumerate(identities):
+        by_identity.setdefault(identity, []).append(index)
+    actual = {pair for members in by_identity.values() for pair in combinations(members, 2)}
+    true = len(predicted & actual)
+    return true / len(predicted) if predicted else 1.0, true / len(actual) if actual else 1.0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--characters", type=int, default=200)
+    parser.add_argument("--mentions", type=int, nargs="+", default=[1000, 5000, 20000])
+    args = parser.parse_args(argv)
+
+    print(f"{'mentions':>9} {'names':>6} {'resolved':>9} {'seconds':>8} {'precision':>10} {'recall':>7}")
+    for count in args.mentions:
+        mentions, identities = make_mentions(args.characters, count)
+        resolver = AliasResolver()
+        start = time.perf_counter()
+        resolved = resolver.resolve(mentions)
+        elapsed = time.perf_counter() - start
+        # Map each mention to the character its name resolved to
+        cluster_of = {char.name: i for i, char in enumerate(resolved)}
+        clusters = {}
+        for index, mention in enumerate(mentions):
+            name = resolver.aliases.get(mention.name, mention.name)
+            clusters.setdefault(cluster_of[name], []).append(index)
+        precision, recall = pair_scores(list(clusters.values()), identities)
+        print(f"{count:>9} {len({m.name for m in mentions}):>6} {len(resolved):>9} {elapsed:>8.3f} "
+              f"{precision:>10.3f} {recall:>7.3f}")
+
+if __name__ == "__main__":
+    sys.exit(main())
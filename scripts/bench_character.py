@@ -0,0 +1,87 @@
+"""Compare character representations: memory per character, save and load time, file size
+
+Usage: python -m scripts.bench_character [--sizes 10000 100000 300000]
+
+"legacy" is the previous mutable dataclass with list traits saved as JSON (as
+the extraction cache does); "slotted" is the current frozen, slotted Character
+with interned traits, also as JSON; "table" is a CharacterTable in its binary
+format. Characters draw their traits from a shared vocabulary, as extracted
+ones do. Load times include building every character object, for the table
+too, so the layouts are compared on the same work. Frozen dataclasses pay for
+their immutability on construction, so "slotted" trades some load time for
+about half the memory of "legacy".
+"""
+import sys
+import gc
+import json
+import time
+import random
+import argparse
+import tracemalloc
+from dataclasses import dataclass, asdict
+from lib.character import Character
+from lib.character_table import CharacterTable
+
+TRAIT_VOCABULARY = 500
+TRAITS_PER_CHARACTER = 5
+
+@dataclass
+class LegacyCharacter:
+    name: str
+    description: str
+    traits: list[str]
+
+def iter_records(count: int):
+    """Raw fields as parsed from model output: every string, trait names included, is a new object"""
+    rng = random.Random(0)
+    for i in range(count):
+        traits = [f"trait number {n}" for n in rng.sample(range(TRAIT_VOCABULARY), TRAITS_PER_CHARACTER)]
+        yield f"Character {i}", f"A description of character {i}, long enough to be realistic. " * 2, traits
+
+def measure(build) -> tuple[object, int]:
+    """Build a value; returns it with the bytes it keeps allocated"""
+    gc.collect()
+    tracemalloc.start()
+    value = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return value, size
+
+def timed(fn, *args) -> tuple[object, float]:
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+def bench_json(cls, count: int) -> dict:
+    characters, size = measure(lambda: [cls(*record) for record in iter_records(count)])
+    data, save = timed(lambda: json.dumps([asdict(c) for c in characters]).encode("utf-8"))
+    loaded, load = timed(lambda: [cls(**c) for c in json.loads(data)])
+    assert len(loaded) == count
+    return {"bytes/char": size / count, "save s": save, "load s": load, "file MB": len(data) / 1e6}
+
+def bench_table(count: int) -> dict:
+    table, size = measure(lambda: CharacterTable.from_characters(Character(*record) for record in iter_records(count)))
+    data, save = timed(table.to_bytes)
+    loaded, load = timed(lambda: list(CharacterTable.from_bytes(data)))
+    assert len(loaded) == count and loaded[-1] == table[-1]
+    return {"bytes/char": size / count, "save s": save, "load s": load, "file MB": len(data) / 1e6}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 300000])
+    args = parser.parse_args(argv)
+
+    print(f"{'layout':>8} {'characters':>10} {'bytes/char':>11} {'save s':>8} {'load s':>8} {'file MB':>8}")
+    for size in args.sizes:
+        results = {
+            "legacy": bench_json(LegacyCharacter, size),
+            "slotted": bench_json(Character, size),
+            "table": bench_table(size),
+        }
+        for layout, result in results.items():
+            print(f"{layout:>8} {size:>10} {result['bytes/char']:>11.0f} {result['save s']:>8.3f} "
+                  f"{result['load s']:>8.3f} {result['file MB']:>8.1f}")
+
+if __name__ == "__main__":
+    sys.exit(main())
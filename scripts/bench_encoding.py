@@ -0,0 +1,49 @@
+"""Compare full-file chardet detection with the bounded, streaming ingest path
+
+Usage: python -m scripts.bench_encoding [--sizes 1 10 50] [--encoding utf-8]
+"""
+import io
+import sys
+import time
+import argparse
+import chardet
+from lib.file_processor import extract_text_file_content
+
+SAMPLE_PARAGRAPH = (
+    "“It is a truth universally acknowledged,” said Élise, “that a café in "
+    "Zürich serves the best crème brûlée.” Naïve as it sounded, nobody argued.\n"
+)
+
+def make_payload(size_mb: int, encoding: str) -> bytes:
+    """Build roughly size_mb megabytes of non-ASCII prose"""
+    unit = SAMPLE_PARAGRAPH.encode(encoding, errors="replace")
+    return unit * (size_mb * 1024 * 1024 // len(unit) + 1)
+
+def legacy_extract(raw_file) -> str:
+    """The previous ingest path: read everything, detect over everything"""
+    raw_data = raw_file.read()
+    result = chardet.detect(raw_data)
+    encoding = result['encoding'] if result['confidence'] > 0.7 else 'latin-1'
+    return raw_data.decode(encoding)
+
+def timed(fn, payload: bytes) -> tuple[float, str]:
+    start = time.perf_counter()
+    text = fn(io.BytesIO(payload))
+    return time.perf_counter() - start, text
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 50], help="file sizes in MB")
+    parser.add_argument("--encoding", default="utf-8")
+    args = parser.parse_args(argv)
+
+    print(f"{'size':>6} {'legacy (s)':>12} {'streaming (s)':>14} {'speedup':>8} {'same text':>10}")
+    for size_mb in args.sizes:
+        payload = make_payload(size_mb, args.encoding)
+        legacy_time, legacy_text = timed(legacy_extract, payload)
+        new_time, new_text = timed(extract_text_file_content, payload)
+        print(f"{size_mb:>4}MB {legacy_time:>12.3f} {new_time:>14.3f} "
+              f"{legacy_time / new_time:>7.1f}x {str(legacy_text == new_text):>10}")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+"""Measure cold-start import cost of the modules the Streamlit entry points load
+
+Usage: python -m scripts.bench_startup [--modules lib.file_processor ui ...] [--repeat 5]
+
+Each import runs in a fresh interpreter, so this is what a new server process
+pays before the first script run. Per-rerun overhead is reported by the apps
+themselves (set SHOW_TIMINGS=1, or read the lib.startup log lines).
+"""
+import sys
+import argparse
+import statistics
+import subprocess
+
+MODULES = [
+    "lib.llm_client", "lib.extraction", "lib.file_processor", "lib.context",
+    "lib.conversation_store", "lib.write_behind", "lib.vector_memory",
+    "lib.response_cache", "ui", "chromadb",
+]
+
+PROBE = """
+import time
+start = time.perf_counter()
+try:
+    import {module}
+except ImportError as e:
+    print("missing")
+else:
+    print(time.perf_counter() - start)
+"""
+
+def time_import(module: str) -> float | None:
+    output = subprocess.run([sys.executable, "-c", PROBE.format(module=module)],
+                            capture_output=True, text=True, check=True).stdout.strip()
+    return None if output == "missing" else float(output)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--modules", nargs="+", default=MODULES)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    print(f"{'module':>22} {'median ms':>10} {'min ms':>8}")
+    for module in args.modules:
+        samples = [time_import(module) for _ in range(args.repeat)]
+        if None in samples:
+            print(f"{module:>22} {'not installed':>19}")
+            continue
+        print(f"{module:>22} {statistics.median(samples) * 1000:>10.1f} {min(samples) * 1000:>8.1f}")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+"""Benchmark conversation-store backends: append, tail-read and cross-user scan throughput
+
+Usage: python -m scripts.bench_storage [--backends memory sqlite chroma] [--sizes 1000 100000 1000000]
+
+Messages are spread over CHARACTERS characters with MESSAGES_PER_CONVERSATION
+messages per user conversation, appended two at a time like a chat turn.
+"""
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+from lib.conversation_store import create_store, conversation_id
+
+CHARACTERS = 10
+MESSAGES_PER_CONVERSATION = 100
+TAIL_LIMIT = 20
+TIMED_READS = 500
+TIMED_SCANS = 20
+
+def populate(store, total_messages: int) -> tuple[list[str], float]:
+    """Append total_messages as user/assistant turns; returns conversation ids and elapsed seconds"""
+    conversations = max(1, total_messages // MESSAGES_PER_CONVERSATION)
+    ids = [conversation_id(f"char{i % CHARACTERS}", f"user{i}") for i in range(conversations)]
+    turns = total_messages // 2
+    start = time.perf_counter()
+    for turn in range(turns):
+        cid = ids[turn % conversations]
+        store.append(cid, [
+            {"role": "user", "content": f"question {turn} about the story", "user": cid},
+            {"role": "assistant", "content": f"answer {turn}, in character and at some length " * 3},
+        ])
+    return ids, time.perf_counter() - start
+
+def bench_backend(backend: str, total_messages: int) -> dict:
+    workdir = tempfile.mkdtemp(prefix=f"bench_{backend}_")
+    path = f"{workdir}/store.db" if backend == "sqlite" else workdir
+    store = create_store(backend, path)
+    try:
+        ids, append_time = populate(store, total_messages)
+
+        rng = random.Random(0)
+        start = time.perf_counter()
+        for _ in range(TIMED_READS):
+            store.read_tail(rng.choice(ids), TAIL_LIMIT)
+        tail_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for i in range(TIMED_SCANS):
+            store.scan(f"char{i % CHARACTERS}-", limit=3)
+        scan_time = time.perf_counter() - start
+
+        return {
+            "append/s": total_messages / append_time,
+            "tail reads/s": TIMED_READS / tail_time,
+            "scans/s": TIMED_SCANS / scan_time,
+            "conversations per scan": len(ids) / CHARACTERS,
+        }
+    finally:
+        store.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", nargs="+", default=["memory", "sqlite", "chroma"])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    args = parser.parse_args(argv)
+
+    print(f"{'backend':>8} {'messages':>10} {'append/s':>12} {'tail reads/s':>13} {'scans/s':>9} {'convs/scan':>11}")
+    for backend in args.backends:
+        for size in args.sizes:
+            result = bench_backend(backend, size)
+            print(f"{backend:>8} {size:>10} {result['append/s']:>12.0f} {result['tail reads/s']:>13.0f} "
+                  f"{result['scans/s']:>9.1f} {result['conversations per scan']:>11.0f}")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""Build character catalogs for a directory of books (.txt/.pdf) in batch
+
+Usage: python -m scripts.build_catalogs BOOKS_DIR [--out catalogs.jsonl] [--ingest-workers 4]
+                                        [--concurrency 8] [--books-in-flight 8] [--retry-failed]
+                                        [--catalog catalog.db]
+
+Text is ingested on a process pool while extraction calls for every book fan
+out through one bounded async pool over the shared, rate-limited model client.
+Each finished book is appended to the output as one JSON line. Books already in
+the output with the same size and mtime are skipped, so an interrupted run
+resumes where it stopped; failed books, and books with failed chunks, are
+retried with --retry-failed. A retried book gets a new line rather than an
+edit in place, so the last line for a path is the one that counts; after each
+run the output is compacted to that one line per book.
+With --catalog, every finished book is also added to the persistent character
+catalog (lib.catalog) so the apps can search across the whole corpus.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from dataclasses import asdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from lib import extraction
+from lib.catalog import CharacterCatalog, book_key
+from lib.file_processor import extract_text_file_content, iter_pdf_pages
+from lib.llm_client import DEFAULT_MODEL, get_client
+
+SUFFIXES = (".txt", ".pdf")
+
+def find_books(directory: str) -> list[str]:
+    paths = []
+    for root, _, files in os.walk(directory):
+        paths.extend(os.path.join(root, name) for name in files if name.lower().endswith(SUFFIXES))
+    return sorted(paths)
+
+def signature(path: str) -> dict:
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime": int(stat.st_mtime)}
+
+def ingest(path: str) -> str:
+    """Read one book's text in a worker process"""
+    if path.lower().endswith(".pdf"):
+        # The batch pool already uses every core; don't nest another one
+        return "\n".join(iter_pdf_pages(path, workers=1))
+    with open(path, "rb") as f:
+        return extract_text_file_content(f)
+
+def load_done(out_path: str, retry_failed: bool) -> dict:
+    """path -> signature of books already in the output"""
+    done = {}
+    if not os.path.exists(out_path):
+        return done
+    with open(out_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # torn last line from an interrupted run
+            # A book with some failed chunks is incomplete, not done
+            if (record.get("error") or record.get("failed_chunks")) and retry_failed:
+                done.pop(record["path"], None)
+            else:
+                done[record["path"]] = {"size": record["size"], "mtime": record["mtime"]}
+    return done
+
+def compact(out_path: str) -> int:
+    """Rewrite the output with only the last record per book; returns how many were dropped"""
+    records = {}
+    dropped = 0
+    with open(out_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                dropped += 1
+                continue
+            dropped += record["path"] in records
+            records.pop(record["path"], None)  # keep the order of the latest write
+            records[record["path"]] = record
+    if dropped:
+        tmp = f"{out_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(record, ensure_ascii=False) + "\n" for record in records.values())
+        os.replace(tmp, out_path)
+    return dropped
+
+class Progress:
+    """Books, chunks and bytes processed, with throughput and an ETA"""
+
+    def __init__(self, total_books: int):
+        self.total_books = total_books
+        self.books = self.failed = self.chunks = self.bytes = self.characters = 0
+        self.started = time.perf_counter()
+
+    def update(self, record: dict):
+        self.books += 1
+        self.failed += bool(record.get("error"))
+        self.chunks += record.get("chunks", 0)
+        self.bytes += record["size"]
+        self.characters += len(record.get("characters", []))
+        elapsed = time.perf_counter() - self.started
+        rate = self.books / elapsed if elapsed else 0.0
+        eta = (self.total_books - self.books) / rate if rate else 0.0
+        status = f"error: {record['error']}" if record.get("error") else \
+            f"{len(record['characters'])} characters from {record['chunks']} chunks in {record['seconds']:.1f}s"
+        print(f"[{self.books}/{self.total_books}] {record['path']}: {status} | "
+              f"{rate * 3600:.0f} books/h, {self.chunks / elapsed:.2f} chunks/s, "
+              f"{self.bytes / elapsed / 1e6:.2f} MB/s, ETA {eta / 60:.0f} min", flush=True)
+
+    def summary(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        return (f"{self.books} books ({self.failed} failed), {self.chunks} chunks, {self.characters} characters "
+                f"in {elapsed:.0f}s: {self.books / elapsed * 3600 if elapsed else 0:.0f} books/h")
+
+async def build(paths: list[str], out_path: str, model, ingest_workers: int, concurrency: int,
+                books_in_flight: int, chunk_size: int, overlap: int, catalog: CharacterCatalog = None) -> Progress:
+    loop = asyncio.get_running_loop()
+    # Model calls block, so each runs on a thread; at most `concurrency` at once across all books
+    calls = asyncio.Semaphore(concurrency)
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=concurrency))
+    # Caps how many ingested texts are held in memory waiting for extraction
+    books = asyncio.Semaphore(books_in_flight)
+    progress = Progress(len(paths))
+
+    async def extract_window(window: str):
+        async with calls:
+            return await asyncio.to_thread(extraction.extract_chunk_characters, model, window)
+
+    async def process(pool, path: str, out):
+        async with books:
+            record = {"path": path, **signature(path)}
+            start = time.perf_counter()
+            try:
+                text = await loop.run_in_executor(pool, ingest, path)
+                windows = extraction.split_text(text, chunk_size, overlap)
+                outcomes = await asyncio.gather(*(extract_window(w) for w in windows), return_exceptions=True)
+                failures = [o for o in outcomes if isinstance(o, BaseException)]
+                if failures and len(failures) == len(outcomes):
+                    raise failures[0]
+                characters = extraction.merge_characters([o for o in outcomes if not isinstance(o, BaseException)])
+                record.update(book_id=book_key(text), chunks=len(windows), failed_chunks=len(failures),
+                              characters=[asdict(c) for c in characters])
+                if catalog is not None:
+                    catalog.add_book(record["book_id"], characters, title=os.path.basename(path))
+            except Exception as e:
+                record["error"] = f"{type(e).__name__}: {e}"
+            record["seconds"] = round(time.perf_counter() - start, 3)
+        # Single writer: the event loop thread; one flushed line per book keeps the file resumable
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+        progress.update(record)
+
+    with ProcessPoolExecutor(max_workers=ingest_workers) as pool, open(out_path, "a", encoding="utf-8") as out:
+        await asyncio.gather(*(process(pool, path, out) for path in paths))
+    return progress
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("books_dir")
+    parser.add_argument("--out", default="catalogs.jsonl")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--ingest-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--concurrency", type=int, default=8, help="model calls in flight")
+    parser.add_argument("--books-in-flight", type=int, default=8)
+    parser.add_argument("--chunk-size", type=int, default=extraction.CHUNK_SIZE)
+    parser.add_argument("--overlap", type=int, default=extraction.CHUNK_OVERLAP)
+    parser.add_argument("--retry-failed", action="store_true")
+    parser.add_argument("--catalog", help="also add each book to the character catalog at this path")
+    args = parser.parse_args(argv)
+
+    done = load_done(args.out, args.retry_failed)
+    paths = [p for p in find_books(args.books_dir) if done.get(p) != signature(p)]
+    print(f"{len(paths)} books to process ({len(done)} already in {args.out})", flush=True)
+    if not paths:
+        return 0
+
+    catalog = CharacterCatalog(args.catalog) if args.catalog else None
+    progress = asyncio.run(build(paths, args.out, get_client(args.model), args.ingest_workers,
+                                 args.concurrency, args.books_in_flight, args.chunk_size, args.overlap, catalog))
+    if catalog is not None:
+        catalog.close()
+    dropped = compact(args.out)
+    if dropped:
+        print(f"Compacted {args.out}: dropped {dropped} superseded records", flush=True)
+    print(progress.summary())
+    return 1 if progress.failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
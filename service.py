@@ -0,0 +1,122 @@
+"""Headless chat service: character extraction, streamed chat turns and history over HTTP
+
+Run with: uvicorn service:app --host 0.0.0.0 --port 8000
+
+Handlers are async; the engine's blocking work runs on the thread pool, so
+requests from every user multiplex over the one pooled model client.
+"""
+import json
+import logging
+from contextlib import asynccontextmanager
+import anyio
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
+from lib.catalog import book_key
+from lib.character import Character
+from lib.chat_engine import ChatEngine
+from lib.startup import load_environment
+
+class CharacterModel(BaseModel):
+    name: str
+    description: str = ""
+    traits: list[str] = Field(default_factory=list)
+
+class ExtractRequest(BaseModel):
+    text: str
+
+class ChatRequest(BaseModel):
+    character: CharacterModel
+    user: str
+    message: str
+    book_id: str | None = None  # from /characters/extract; adds relevant book passages
+
+logger = logging.getLogger(__name__)
+
+engine: ChatEngine = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global engine
+    load_environment()
+    engine = ChatEngine.from_env()
+    try:
+        yield
+    finally:
+        # Flushes the write-behind queue
+        await run_in_threadpool(engine.close)
+
+app = FastAPI(title="Character chat service", lifespan=lifespan)
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.get("/health")
+async def health():
+    stats = {"model": getattr(engine.model, "model_name", None)}
+    if engine.response_cache is not None:
+        stats["response_cache"] = {**engine.response_cache.stats, "hit_rate": engine.response_cache.hit_rate()}
+    stats["book_retrieval"] = dict(engine.books.stats)
+    return stats
+
+@app.post("/characters/extract")
+async def extract_characters(request: ExtractRequest):
+    try:
+        characters = await run_in_threadpool(engine.extract_characters, request.text)
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Character extraction failed: {e}")
+    return {"book_id": book_key(request.text),
+            "characters": [{"name": c.name, "description": c.description, "traits": c.traits}
+                           for c in characters]}
+
+@app.get("/conversations/messages")
+async def read_history_by_query(character: str, user: str, limit: int = None, before_seq: int = None):
+    """Like read_history, for names with "/" or other characters that cannot go in a path segment"""
+    return await read_history(character, user, limit, before_seq)
+
+@app.get("/conversations/{char_name}/{user}/messages")
+async def read_history(char_name: str, user: str, limit: int = None, before_seq: int = None):
+    messages = await run_in_threadpool(engine.history, char_name, user, limit, before_seq)
+    return {"messages": messages}
+
+@app.post("/chat")
+async def chat(request: ChatRequest):
+    """Stream a reply as server-sent events: chunk*, then error?, then done"""
+    character = Character(request.character.name, request.character.description, list(request.character.traits))
+    try:
+        turn = await run_in_threadpool(engine.start_turn, character, request.user, request.message, request.book_id)
+    except Exception as e:
+        logger.exception("Could not start a chat turn")
+        return _event_stream(_failed_turn_events(e))
+
+    async def events():
+        chunks = iter(turn)
+        try:
+            while True:
+                # Shielded so a disconnect waits for the chunk being read: finish() must not run beside it
+                with anyio.CancelScope(shield=True):
+                    text = await run_in_threadpool(next, chunks, None)
+                if text is None:
+                    break
+                yield _sse("chunk", {"text": text})
+        finally:
+            # Also reached when the client disconnects: keep what was generated
+            turn.cancel()
+            with anyio.CancelScope(shield=True):
+                message = await run_in_threadpool(turn.finish)
+        if turn.error is not None:
+            yield _sse("error", {"message": str(turn.error)})
+        yield _sse("done", {"message": message, "completed": turn.completed, "cached": turn.cached,
+                            "retrieval_ms": turn.retrieval_ms, "retrieval": turn.retrieval})
+
+    return _event_stream(events())
+
+async def _failed_turn_events(error: Exception):
+    yield _sse("error", {"message": f"Could not start the reply: {error}"})
+    yield _sse("done", {"message": None, "completed": False, "cached": False,
+                        "retrieval_ms": None, "retrieval": None})
+
+def _event_stream(events) -> StreamingResponse:
+    return StreamingResponse(events, media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -0,0 +1,43 @@
+import gzip
+from lib.cassette import CassetteModel
+
+class EchoModel:
+    model_name = "echo"
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        return type("Response", (), {"text": f"echo {contents}"})()
+
+def record_without_closing(path, prompts):
+    """Record calls the way a killed run leaves them: flushed, but no gzip end-of-stream marker"""
+    cassette = CassetteModel(str(path), "record", EchoModel())
+    for prompt in prompts:
+        cassette.generate_content(prompt)
+    with open(path, "rb") as f:
+        data = f.read()
+    cassette.close()
+    with open(path, "wb") as f:
+        f.write(data)
+
+def test_replays_entries_of_a_truncated_gzip_cassette(tmp_path):
+    path = tmp_path / "run.jsonl.gz"
+    record_without_closing(path, ["a", "b", "c"])
+    with open(path, "rb") as f, gzip.open(f) as g:
+        try:
+            g.read()
+            raise AssertionError("expected an incomplete gzip stream")
+        except EOFError:
+            pass
+
+    cassette = CassetteModel(str(path), "replay", latency_scale=0)
+    assert [cassette.generate_content(p).text for p in "abc"] == ["echo a", "echo b", "echo c"]
+
+def test_auto_mode_repairs_a_truncated_cassette_before_appending(tmp_path):
+    path = tmp_path / "run.jsonl.gz"
+    record_without_closing(path, ["a", "b"])
+
+    cassette = CassetteModel(str(path), "auto", EchoModel(), latency_scale=0)
+    cassette.generate_content("c")
+    cassette.close()
+
+    replay = CassetteModel(str(path), "replay", latency_scale=0)
+    assert [replay.generate_content(p).text for p in "abc"] == ["echo a", "echo b", "echo c"]
@@ -0,0 +1,20 @@
+from lib.character import Character
+from lib.chat_engine import ChatEngine
+from lib.conversation_store import MemoryConversationStore, conversation_id
+
+class FailingModel:
+    model_name = "failing"
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        raise RuntimeError("model unavailable")
+
+def test_user_message_is_kept_when_the_reply_fails_before_its_first_chunk():
+    store = MemoryConversationStore()
+    engine = ChatEngine(FailingModel(), store)
+    turn = engine.start_turn(Character("Ann", "a", []), "bob", "hello")
+    assert list(turn) == []
+    assert turn.error is not None and turn.finish() is None
+
+    messages = store.read_range(conversation_id("Ann", "bob"), 0)
+    assert [m["role"] for m in messages] == ["assistant", "user"]  # greeting, then the prompt
+    assert messages[-1]["content"] == "hello"
@@ -0,0 +1,32 @@
+import threading
+import time
+from lib.character import Character
+from lib.extraction import iter_extracted_characters, merge_characters, parse_characters
+
+def test_entries_without_a_name_are_skipped():
+    text = '[{"name": null, "description": "x"}, {"name": "Ann", "description": null, "traits": null}]'
+    assert parse_characters(text) == [Character("Ann", "No description", [])]
+    assert merge_characters([[Character("", "x", [])], parse_characters(text)], False) == [
+        Character("Ann", "No description", [])]
+
+def test_closing_early_does_not_wait_for_pending_chunks():
+    release = threading.Event()
+    started = []
+
+    def stream_fn(model, chunk):
+        started.append(chunk)
+        if len(started) > 1:
+            release.wait(5)
+        yield Character(f"Person {len(started)}", "d", [])
+
+    text = "\n\n".join(f"paragraph {i} " * 20 for i in range(4))
+    characters = iter_extracted_characters(None, text, chunk_size=250, overlap=0,
+                                           max_workers=2, stream_fn=stream_fn)
+    assert next(characters)
+    begin = time.monotonic()
+    characters.close()
+    elapsed = time.monotonic() - begin
+    release.set()
+    time.sleep(0.1)
+    assert elapsed < 1
+    assert len(started) < 4  # the queued chunks were cancelled
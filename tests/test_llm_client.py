@@ -0,0 +1,56 @@
+import threading
+import pytest
+from lib.llm_client import DeadlineExceeded, LLMClient
+
+class Response:
+    def __init__(self, text):
+        self.text = text
+
+class HangingModel:
+    """Blocks every call (or, streaming, after the first chunk) until released"""
+    model_name = "hanging"
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls = 0
+
+    def generate_content(self, contents, stream=False):
+        self.calls += 1
+        if not stream:
+            self.release.wait()
+            return Response("late")
+
+        def chunks():
+            yield Response("first")
+            self.release.wait()
+            yield Response("late")
+        return chunks()
+
+def test_call_past_its_deadline_keeps_its_slot_until_the_backend_returns():
+    model = HangingModel()
+    client = LLMClient(model, max_concurrency=1, rate_per_second=0, timeout=0.2)
+    with pytest.raises(DeadlineExceeded):
+        client.generate_content("hang")
+
+    # The abandoned call is still running, so no second call reaches the backend
+    with pytest.raises(DeadlineExceeded, match="free model slot"):
+        client.generate_content("next")
+    assert model.calls == 1
+
+    model.release.set()
+    assert client.generate_content("next").text == "late"
+
+def test_stalled_stream_keeps_its_slot_until_the_backend_returns():
+    model = HangingModel()
+    client = LLMClient(model, max_concurrency=1, rate_per_second=0, timeout=0.2)
+    stream = client.generate_content("hang", stream=True)
+    assert next(stream).text == "first"
+    with pytest.raises(DeadlineExceeded):
+        next(stream)
+
+    with pytest.raises(DeadlineExceeded, match="free model slot"):
+        client.generate_content("next")
+    assert model.calls == 1
+
+    model.release.set()
+    assert client.generate_content("next").text == "late"
@@ -1,7 +1,19 @@
+import os
+import html
+import functools
 import streamlit as st
+from lib.catalog import book_key, get_catalog
 from lib.character import Character
 from lib.file_processor import extract_text_from_uploaded_file
-from .app import extract_characters  # Import from main
+from lib.startup import RunTimer
+from lib.streaming import ReplyStream
+
+# Messages per history page; only the newest page is rendered until older ones are requested
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "50"))
+
+# Reruns only the decorated view on interaction (st.fragment from Streamlit 1.37,
+# st.experimental_fragment from 1.33); older versions rerun the whole script
+fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda fn: fn)
 
 def setup_page():
     """Configure the page with professional styling"""
@@ -46,15 +58,15 @@ def create_sidebar(characters: list[Character], current_character: Character, ex
         # Character selection
         with st.expander("🧙 Character Selection", expanded=True):
             if characters:
+                # The selection persists under its key, so no index lookup is needed
                 selected_char = st.selectbox(
                     "Choose Character",
                     options=[char.name for char in characters],
-                    index=[char.name for char in characters].index(current_character.name) if current_character else 0,
                     key="char_select"
                 )
                 
                 if st.button("Switch Character", use_container_width=True):
-                    st.session_state.current_character = next(char for char in characters if char.name == selected_char)
+                    st.session_state.current_character = get_catalog().find(selected_char, st.session_state.get("book_id"))
                     st.rerun()
                 
                 if current_character:
@@ -74,11 +86,13 @@ def setup_file_upload(extract_characters_fn):
     input_method = st.radio("Input method:", ("Paste text", "Upload file"), horizontal=True)
     
     book_text = ""
+    title = "Pasted text"
     if input_method == "Paste text":
         book_text = st.text_area("Paste your text here:", height=150)
     else:
         uploaded_file = st.file_uploader("Choose a file:", type=["txt", "pdf"])
         if uploaded_file:
+            title = uploaded_file.name
             with st.spinner("Processing file..."):
                 book_text = extract_text_from_uploaded_file(uploaded_file)
                 if book_text:
@@ -88,7 +102,11 @@ def setup_file_upload(extract_characters_fn):
         with st.spinner("Analyzing content..."):
             st.session_state.characters = extract_characters_fn(book_text)
             if st.session_state.characters:
+                st.session_state.book_id = book_key(book_text)
+                get_catalog().add_book(st.session_state.book_id, st.session_state.characters, title=title)
                 st.session_state.current_character = st.session_state.characters[0]
+                # Start the selector on the new book's first character
+                st.session_state.pop("char_select", None)
                 st.success(f"Found {len(st.session_state.characters)} characters")
                 st.rerun()
 
@@ -104,21 +122,89 @@ def display_chat_header(character: Character):
 
 def display_message(msg):
     """Display a chat message with professional styling"""
-    col1, col2 = st.columns([1, 4])
-    with col1:
-        st.markdown(f"**{msg['role'].title()}**")
-    with col2:
-        with st.container():
-            st.markdown(f"""
-            <div class="chat-message {'user-message' if msg['role'] == 'user' else 'assistant-message'}">
-                {msg['content']}
-            </div>
-            """, unsafe_allow_html=True)
-
-def display_conversation_history(messages):
-    """Display the entire conversation thread"""
-    for msg in messages:
-        display_message(msg)
+    st.markdown(render_message_html(msg['role'], msg['content']), unsafe_allow_html=True)
+
+@functools.lru_cache(maxsize=4096)
+def render_message_html(role: str, content: str) -> str:
+    """Styled HTML for one message, cached so history reruns skip the markdown pass"""
+    css = 'user-message' if role == 'user' else 'assistant-message'
+    return (f'<div class="chat-message {css}"><strong>{html.escape(role.title())}</strong>'
+            f'{_markdown_renderer().render(content)}</div>')
+
+@functools.lru_cache(maxsize=1)
+def _markdown_renderer():
+    from markdown_it import MarkdownIt
+    # Raw HTML in a message is escaped rather than injected
+    return MarkdownIt("commonmark", {"html": False})
+
+def history_start(key: str, total: int, page_size: int = HISTORY_PAGE_SIZE) -> int:
+    """Index of the first message to show: the partial tail plus `pages` full pages before it"""
+    pages = st.session_state.setdefault(f"{key}_pages", 1)
+    # Pages are aligned to absolute indices so only the newest one changes between reruns
+    return max(0, total // page_size - pages) * page_size
+
+def _load_older(key: str):
+    st.session_state[f"{key}_pages"] += 1
+
+def _older_button(key: str, hidden: int):
+    st.button(f"Load older messages ({hidden} earlier)", key=f"{key}_older",
+              on_click=_load_older, args=(key,))
+
+@fragment
+def display_conversation_history(messages, key: str = "history", page_size: int = HISTORY_PAGE_SIZE,
+                                 offset: int = 0):
+    """
+    Display the latest page of a conversation thread, older pages on demand
+
+    `messages` may be only the tail of the thread, from index `offset`, as
+    long as it covers the pages on screen (see history_start). Each page is
+    one markdown element joined from per-message cached HTML. Inside a
+    fragment, loading older pages already in `messages` reruns only this view.
+    """
+    total = offset + len(messages)
+    start = history_start(key, total, page_size)
+    if start < offset:
+        # A page older than the caller read was asked for; a full rerun reads it
+        st.rerun()
+    if start:
+        _older_button(key, start)
+    for page_start in range(start, total, page_size):
+        page = messages[page_start - offset:page_start - offset + page_size]
+        st.markdown("".join(render_message_html(msg['role'], msg['content']) for msg in page),
+                    unsafe_allow_html=True)
+
+@fragment
+def display_chat_window(messages, key: str, page_size: int = HISTORY_PAGE_SIZE):
+    """st.chat_message view of the latest page of messages, older pages on demand"""
+    start = history_start(key, len(messages), page_size)
+    if start:
+        _older_button(key, start)
+    for msg in messages[start:]:
+        st.chat_message(msg["role"]).write(msg["content"])
+
+def stream_assistant_reply(stream: ReplyStream, messages: list, placeholder=None) -> dict | None:
+    """Render a reply as it streams in, then commit it to the conversation
+
+    Partial replies (error or cancellation, including a Streamlit rerun
+    interrupting the loop) are still committed, flagged as interrupted. A
+    reply that fails before its first chunk adds nothing, but the user's
+    message already in `messages` stays there to be persisted.
+    """
+    placeholder = placeholder if placeholder is not None else st.empty()
+    try:
+        for _ in stream:
+            placeholder.markdown(stream.text + " ▌")
+    finally:
+        message = stream.to_message()
+        if message:
+            messages.append(message)
+            placeholder.markdown(stream.text)
+        else:
+            placeholder.empty()
+
+    if stream.error:
+        st.error(f"Error generating response: {str(stream.error)}")
+    return message
 
 def display_user_input(character: Character):
     """Display the user input area"""
@@ -137,4 +223,11 @@ def display_user_input(character: Character):
     
     if submitted and prompt:
         return prompt
-    return None
\ No newline at end of file
+    return None
+
+def show_run_timings(timer: RunTimer):
+    """Log the run's phase timings, and show them in the sidebar when SHOW_TIMINGS is set"""
+    report = timer.report()
+    if os.getenv("SHOW_TIMINGS"):
+        with st.sidebar.expander("⏱️ Run timings", expanded=False):
+            st.json(report)